@@ -0,0 +1,392 @@
+# MyTT 原始实现，仅用于和 mytt 包中向量化版本做结果比对，不在策略里调用，也不随 mytt 包部署
+# 运行 python bench_mytt.py 做一致性检查，加参数 bench 跑 5000x250 面板的耗时对比
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import mytt.MyTT as fast
+import mytt.MyTT_panel as panel
+import mytt.MyTT_advance as advance
+import mytt.MyTT_custom as custom
+import mytt.MyTT_stream as stream
+
+
+def SLOPE(S, N):  # 返S序列N周期回线性回归斜率
+    return pd.Series(S).rolling(N).apply(lambda x: np.polyfit(range(N), x, deg=1)[0], raw=True).values
+
+
+def FORCAST(S, N):  # 返回S序列N周期回线性回归后的预测值， jqz1226改进成序列出
+    return pd.Series(S).rolling(N).apply(lambda x: np.polyval(np.polyfit(range(N), x, deg=1), N - 1), raw=True).values
+
+
+def HHVBARS(S, N):  # 求N周期内S最高值到当前周期数, 返回序列
+    return pd.Series(S).rolling(N).apply(lambda x: np.argmax(x[::-1]), raw=True).values
+
+
+def LLVBARS(S, N):  # 求N周期内S最低值到当前周期数, 返回序列
+    return pd.Series(S).rolling(N).apply(lambda x: np.argmin(x[::-1]), raw=True).values
+
+
+def WMA(S, N):  # 通达信S序列的N日加权移动平均 Yn = (1*X1+2*X2+3*X3+...+n*Xn)/(1+2+3+...+Xn)
+    return pd.Series(S).rolling(N).apply(lambda x: x[::-1].cumsum().sum() * 2 / N / (N + 1), raw=True).values
+
+
+def AVEDEV(S, N):  # 平均绝对偏差  (序列与其平均值的绝对差的平均值)
+    return pd.Series(S).rolling(N).apply(lambda x: (np.abs(x - x.mean())).mean()).values
+
+
+def BARSSINCEN(S, N):  # N周期内第一次S条件成立到现在的周期数,N为常量  by jqz1226
+    return pd.Series(S).rolling(N).apply(lambda x: N - 1 - np.argmax(x) if np.argmax(x) or x[0] else 0,
+                                         raw=True).fillna(0).values.astype(int)
+
+
+def DMA(S, A):  # 求S的动态移动平均，A作平滑因子,必须 0<A<1  (此为核心函数，非指标）
+    if isinstance(A, (int, float)):  return pd.Series(S).ewm(alpha=A, adjust=False).mean().values
+    A = np.array(A);
+    A[np.isnan(A)] = 1.0;
+    Y = np.zeros(len(S));
+    Y[0] = S[0]
+    for i in range(1, len(S)): Y[i] = A[i] * S[i] + (1 - A[i]) * Y[i - 1]  # A支持序列 by jqz1226
+    return Y
+
+
+def FILTER(S, N):  # FILTER函数，S满足条件后，将其后N周期内的数据置为0, FILTER(C==H,5)
+    for i in range(len(S)): S[i + 1:i + 1 + N] = 0 if S[i] else S[i + 1:i + 1 + N]
+    return S  # 例：FILTER(C==H,5) 涨停后，后5天不再发出信号
+
+
+def BARSLAST(S):  # 上一次条件成立到当前的周期, BARSLAST(C/REF(C,1)>=1.1) 上一次涨停到今天的天数
+    M = np.concatenate(([0], np.where(S, 1, 0)))
+    for i in range(1, len(M)):  M[i] = 0 if M[i] else M[i - 1] + 1
+    return M[1:]
+
+
+def BARSLASTCOUNT(S):  # 统计连续满足S条件的周期数        by jqz1226
+    rt = np.zeros(len(S) + 1)  # BARSLASTCOUNT(CLOSE>OPEN)表示统计连续收阳的周期数
+    for i in range(len(S)): rt[i + 1] = rt[i] + 1 if S[i] else rt[i + 1]
+    return rt[1:]
+
+
+def TOPRANGE(S):  # TOPRANGE(HIGH)表示当前最高价是近多少周期内最高价的最大值 by jqz1226
+    rt = np.zeros(len(S))
+    for i in range(1, len(S)):  rt[i] = np.argmin(np.flipud(S[:i] < S[i]))
+    return rt.astype('int')
+
+
+def LOWRANGE(S):  # LOWRANGE(LOW)表示当前最低价是近多少周期内最低价的最小值 by jqz1226
+    rt = np.zeros(len(S))
+    for i in range(1, len(S)):  rt[i] = np.argmin(np.flipud(S[:i] > S[i]))
+    return rt.astype('int')
+
+
+def HHV_PLUS(S, N):  # MyTT_advance 中 N 为序列时的原实现
+    res = np.repeat(np.nan, len(S))
+    for i in range(len(S)):
+        if (not np.isnan(N[i])) and 0 < N[i] <= i + 1:
+            res[i] = S[i + 1 - N[i]:i + 1].max()
+    return res
+
+
+def LLV_PLUS(S, N):  # MyTT_advance 中 N 为序列时的原实现
+    res = np.repeat(np.nan, len(S))
+    for i in range(len(S)):
+        if (not np.isnan(N[i])) and 0 < N[i] <= i + 1:
+            res[i] = S[i + 1 - N[i]:i + 1].min()
+    return res
+
+
+def COUNT_PLUS(S, N):
+    res = np.repeat(np.nan, len(S))
+    for i in range(len(S)):
+        if (not np.isnan(N[i])):
+            if 0 < N[i] <= i + 1:
+                res[i] = np.sum(S[max(0, i + 1 - N[i]):i + 1])
+            if N[i] == 0:
+                res[i] = 0
+    return res.astype(int)
+
+
+def REF_PLUS(S, N):
+    result = np.repeat(np.nan, len(S))
+
+    nCount = len(N)
+    for i in range(len(S)):
+        if i >= nCount:
+            continue
+
+        value = N[i]
+
+        value = int(value)
+        if value >= 0 and value <= i:
+            result[i] = S[i - value]
+        elif i:
+            result[i] = result[i - 1]
+        else:
+            result[i] = S[i]
+
+    return result
+
+
+# 一维序列参与比对的函数，BARSSINCEN 单独用布尔序列比对
+ROLLING_FUNCS = ['SLOPE', 'FORCAST', 'HHVBARS', 'LLVBARS', 'WMA', 'AVEDEV']
+
+
+# ------------------ 一致性检查 --------------------------------------------
+def random_series(rng, n, with_nan=True):
+    S = np.cumsum(rng.normal(0, 1, n)) + 100
+    if with_nan and n > 10:
+        S[rng.integers(0, n, n // 20 + 1)] = np.nan
+    return S
+
+
+def assert_same(name, a, b, rtol=1e-9, atol=1e-9):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    if a.shape != b.shape or not np.allclose(a, b, rtol=rtol, atol=atol, equal_nan=True):
+        diff = np.nanmax(np.abs(a - b)) if a.shape == b.shape else 'shape'
+        raise AssertionError(f'{name} 不一致: {diff}')
+
+
+def assert_exact(name, a, b):
+    # 计数类函数要求类型和数值都完全一致
+    a = np.asarray(a)
+    b = np.asarray(b)
+    if a.dtype != b.dtype or a.shape != b.shape or not np.array_equal(a, b, equal_nan=a.dtype.kind == 'f'):
+        raise AssertionError(f'{name} 不一致: {a.dtype} {b.dtype}')
+
+
+def check_loop_funcs(rng, n, N):
+    S = random_series(rng, n)
+    B = rng.random(n) < 0.3
+    for cond in [B, S > 100, np.where(B, np.nan, 0.0)]:
+        assert_exact(f'BARSLAST n={n}', fast.BARSLAST(cond), BARSLAST(cond))
+        assert_exact(f'BARSLASTCOUNT n={n}', fast.BARSLASTCOUNT(cond), BARSLASTCOUNT(cond))
+        assert_exact(f'FILTER n={n} N={N}', fast.FILTER(cond.copy(), N), FILTER(cond.copy(), N))
+
+    # 含重复值和nan的价格序列
+    R = np.round(S)
+    for P in [S, R]:
+        assert_exact(f'TOPRANGE n={n}', fast.TOPRANGE(P), TOPRANGE(P))
+        assert_exact(f'LOWRANGE n={n}', fast.LOWRANGE(P), LOWRANGE(P))
+
+    if n > 0:
+        A = rng.random(n)
+        A[rng.random(n) < 0.1] = np.nan
+        C = np.nan_to_num(S, nan=100.0)
+        assert_same(f'DMA n={n}', fast.DMA(C, A), DMA(C, A.copy()))
+        assert_same(f'DMA const n={n}', fast.DMA(C, 0.3), DMA(C, 0.3))
+
+
+# 面板版本与 MyTT 逐只计算比对: (函数名, 参数生成)
+PANEL_FUNCS = [
+    ('REF', lambda C, H, L, V: (C, 3)),
+    ('DIFF', lambda C, H, L, V: (C, 2)),
+    ('STD', lambda C, H, L, V: (C, 10)),
+    ('SUM', lambda C, H, L, V: (C, 5)),
+    ('SUM', lambda C, H, L, V: (C, 0)),
+    ('MA', lambda C, H, L, V: (C, 5)),
+    ('EMA', lambda C, H, L, V: (C, 12)),
+    ('SMA', lambda C, H, L, V: (C, 6, 2)),
+    ('MACD', lambda C, H, L, V: (C,)),
+    ('RSI', lambda C, H, L, V: (C, 6)),
+    ('BIAS', lambda C, H, L, V: (C,)),
+    ('BOLL', lambda C, H, L, V: (C,)),
+    ('PSY', lambda C, H, L, V: (C,)),
+    ('CCI', lambda C, H, L, V: (C, H, L)),
+    ('ATR', lambda C, H, L, V: (C, H, L)),
+    ('BBI', lambda C, H, L, V: (C,)),
+    ('DMI', lambda C, H, L, V: (C, H, L)),
+    ('TRIX', lambda C, H, L, V: (C,)),
+    ('VR', lambda C, H, L, V: (C, V)),
+    ('MTM', lambda C, H, L, V: (C,)),
+    ('ROC', lambda C, H, L, V: (C,)),
+]
+
+
+def random_panel(rng, codes, bars):
+    C = np.cumsum(rng.normal(0, 1, (codes, bars)), axis=1) + 100
+    H = C + rng.uniform(0, 1, (codes, bars))
+    L = C - rng.uniform(0, 1, (codes, bars))
+    V = rng.integers(1, 10 ** 6, (codes, bars)).astype(float)
+    return C, H, L, V
+
+
+def check_panel(rng):
+    C, H, L, V = random_panel(rng, 6, 120)
+    C[0, :20] = np.nan  # 模拟未上市
+    for name, make_args in PANEL_FUNCS:
+        args = make_args(C, H, L, V)
+        result = getattr(panel, name)(*args)
+        rows = [getattr(fast, name)(*[a[i] if isinstance(a, np.ndarray) else a for a in args]) for i in range(len(C))]
+        if isinstance(result, tuple):
+            for k, part in enumerate(result):
+                assert_same(f'panel {name}[{k}]', part, np.vstack([row[k] for row in rows]))
+        else:
+            assert_same(f'panel {name}', result, np.vstack(rows))
+
+    for name in ['HHV', 'LLV']:
+        assert_same(f'panel {name}', getattr(panel, name)(H, 9), np.vstack([getattr(advance, name)(h, 9) for h in H]))
+    assert_exact('panel CROSS', panel.CROSS(C, H - 0.5), np.vstack([fast.CROSS(c, h - 0.5) for c, h in zip(C, H)]))
+    assert_same('panel 1D', panel.MACD(C[1])[2], fast.MACD(C[1])[2])
+
+
+def check_variable_windows(rng, n):
+    # N 为序列的函数, 窗口含 0、负数、越界和超长的情况
+    if n == 0:
+        return
+    S = random_series(rng, n)
+    N = rng.integers(-2, n + 3, n)
+    N = np.where(rng.random(n) < 0.5, rng.integers(0, 8, n), N)  # 一半用短窗口
+    with np.errstate(invalid='ignore'):
+        assert_exact(f'HHV_PLUS n={n}', advance.HHV(S, N), HHV_PLUS(S, N))
+        assert_exact(f'LLV_PLUS n={n}', advance.LLV(S, N), LLV_PLUS(S, N))
+        assert_exact(f'HHV_PLUS Series n={n}', advance.HHV(pd.Series(S), N), HHV_PLUS(pd.Series(S), N))
+        B = rng.random(n) < 0.4
+        assert_exact(f'COUNT_PLUS n={n}', custom.COUNT_PLUS(B, N), COUNT_PLUS(B, N))
+        assert_exact(f'COUNT_PLUS int n={n}', custom.COUNT_PLUS(B.astype(int), N), COUNT_PLUS(B.astype(int), N))
+    for M in [N, N[:max(0, n - 5)], N.astype(float) + 0.5]:
+        assert_exact(f'REF_PLUS n={n} len={len(M)}', custom.REF_PLUS(S, M), REF_PLUS(S, M))
+
+
+# 流式版本: 用前 n-1 根初始化，update 最后一根，应等于整条序列计算的最后一个值
+STREAM_FUNCS = [
+    ('EMA', (12,), lambda C, H, L: panel.EMA(C, 12)),
+    ('SMA', (6, 2), lambda C, H, L: panel.SMA(C, 6, 2)),
+    ('MA', (5,), lambda C, H, L: panel.MA(C, 5)),
+    ('MACD', (), lambda C, H, L: panel.MACD(C)),
+    ('KDJ', (), lambda C, H, L: panel.KDJ(C, H, L)),
+    ('RSI', (6,), lambda C, H, L: panel.RSI(C, 6)),
+    ('BOLL', (), lambda C, H, L: panel.BOLL(C)),
+    ('CCI', (), lambda C, H, L: panel.CCI(C, H, L)),
+    ('ATR', (), lambda C, H, L: panel.ATR(C, H, L)),
+]
+
+
+def check_stream(rng):
+    for n in [1, 2, 5, 13, 14, 15, 20, 21, 40, 120]:
+        C, H, L, V = [x[0] for x in random_panel(rng, 1, n)]
+        for name, params, full in STREAM_FUNCS:
+            expected = full(C, H, L)
+            obj = getattr(stream, name)(*params)
+            if name in ['EMA', 'SMA', 'MA']:
+                obj.seed(C[:-1])
+            else:
+                obj.seed(C[:-1], H[:-1], L[:-1])
+            live = obj.update(C[-1], H[-1], L[-1], V[-1])
+            again = obj.update(C[-1], H[-1], L[-1], V[-1])  # update 不改变状态
+            assert_same(f'stream {name} n={n} 重复update', np.ravel(live), np.ravel(again))
+            if isinstance(expected, tuple):
+                for k, part in enumerate(expected):
+                    assert_same(f'stream {name}[{k}] n={n}', live[k], part[-1], rtol=1e-7, atol=1e-7)
+            else:
+                assert_same(f'stream {name} n={n}', live, expected[-1], rtol=1e-7, atol=1e-7)
+
+
+def check_parity(trials=200, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(trials):
+        n = int(rng.integers(0, 80))
+        N = int(rng.integers(2, 12))
+        S = random_series(rng, n)
+        for name in ROLLING_FUNCS:
+            assert_same(f'{name} n={n} N={N}', getattr(fast, name)(S, N), globals()[name](S, N))
+
+        B = rng.random(n) < 0.2
+        A = fast.BARSSINCEN(B, N)
+        assert A.dtype == BARSSINCEN(B, N).dtype
+        assert_same(f'BARSSINCEN n={n} N={N}', A, BARSSINCEN(B, N))
+        assert_same(f'BARSSINCEN float n={n} N={N}', fast.BARSSINCEN(S - 100, N), BARSSINCEN(S - 100, N))
+
+        check_loop_funcs(rng, n, N)
+        check_variable_windows(rng, n)
+
+    # 二维面板逐行与一维结果一致
+    P = np.vstack([random_series(rng, 60) for _ in range(8)])
+    for N in [3, 5, 9]:
+        for name in ROLLING_FUNCS:
+            assert_same(f'{name} 2D', getattr(fast, name)(P, N), np.vstack([globals()[name](row, N) for row in P]))
+        assert_same('BARSSINCEN 2D', fast.BARSSINCEN(P > 101, N), np.vstack([BARSSINCEN(row, N) for row in P > 101]))
+    check_panel(rng)
+    check_stream(rng)
+    print(f'parity ok: {trials} random series + 2D panel, numba: {fast.njit is not None}')
+
+
+def benchmark(codes=5000, bars=250, N=10, seed=0):
+    # 旧实现只能逐只股票计算，新实现一次算完整个面板
+    rng = np.random.default_rng(seed)
+    P = np.cumsum(rng.normal(0, 1, (codes, bars)), axis=1) + 100
+    B = rng.random((codes, bars)) < 0.2
+    for name in ROLLING_FUNCS + ['BARSSINCEN']:
+        data = B if name == 'BARSSINCEN' else P
+        t0 = time.perf_counter()
+        new = getattr(fast, name)(data, N)
+        t1 = time.perf_counter()
+        old = np.vstack([globals()[name](row, N) for row in data])
+        t2 = time.perf_counter()
+        assert_same(f'{name} bench', new, old, rtol=1e-7, atol=1e-7)
+        print(f'{name:<10} old {t2 - t1:8.3f}s  new {t1 - t0:8.4f}s  x{(t2 - t1) / max(t1 - t0, 1e-9):,.0f}')
+
+    # 面板版本一次算完全市场
+    C, H, L, V = random_panel(rng, codes, bars)
+    t0 = time.perf_counter()
+    panel.MACD(C)
+    panel.KDJ(C, H, L)
+    panel.RSI(C)
+    panel.BOLL(C)
+    panel.CCI(C, H, L)
+    panel.ATR(C, H, L)
+    t1 = time.perf_counter()
+    for i in range(min(codes, 500)):
+        fast.MACD(C[i])
+        fast.RSI(C[i])
+        fast.BOLL(C[i])
+        fast.CCI(C[i], H[i], L[i])
+        fast.ATR(C[i], H[i], L[i])
+    t2 = time.perf_counter()
+    print(f'panel MACD+KDJ+RSI+BOLL+CCI+ATR {codes}x{bars}: {t1 - t0:.3f}s, '
+          f'逐只(不含KDJ) 估算 {(t2 - t1) / min(codes, 500) * codes:.3f}s')
+
+    # N 为序列的变长窗口函数
+    S = np.cumsum(rng.normal(0, 1, bars * 40)) + 100
+    W = rng.integers(1, 120, len(S))
+    B = S > 100
+    for name, new_func, old_func, args in [
+        ('HHV_PLUS', advance.HHV, HHV_PLUS, (S, W)),
+        ('LLV_PLUS', advance.LLV, LLV_PLUS, (S, W)),
+        ('COUNT_PLUS', custom.COUNT_PLUS, COUNT_PLUS, (B, W)),
+        ('REF_PLUS', custom.REF_PLUS, REF_PLUS, (S, W)),
+    ]:
+        t0 = time.perf_counter()
+        new_func(*args)
+        t1 = time.perf_counter()
+        old_func(*args)
+        t2 = time.perf_counter()
+        print(f'{name:<13} old {t2 - t1:8.3f}s  new {t1 - t0:8.4f}s  x{(t2 - t1) / max(t1 - t0, 1e-9):,.0f}')
+
+    # 循环类函数是一维的，用一条长序列对比
+    S = np.cumsum(rng.normal(0, 1, bars * 40)) + 100
+    for name in ['BARSLAST', 'BARSLASTCOUNT', 'FILTER', 'TOPRANGE', 'LOWRANGE', 'DMA']:
+        args = {
+            'BARSLAST': lambda: (S > 100,),
+            'BARSLASTCOUNT': lambda: (S > 100,),
+            'FILTER': lambda: ((S > 100).copy(), N),
+            'TOPRANGE': lambda: (S,),
+            'LOWRANGE': lambda: (S,),
+            'DMA': lambda: (S, np.full(len(S), 0.3)),
+        }[name]
+        getattr(fast, name)(*args())  # 预热, 排除numba首次编译耗时
+        t0 = time.perf_counter()
+        getattr(fast, name)(*args())
+        t1 = time.perf_counter()
+        globals()[name](*args())
+        t2 = time.perf_counter()
+        print(f'{name:<13} old {t2 - t1:8.3f}s  new {t1 - t0:8.4f}s  x{(t2 - t1) / max(t1 - t0, 1e-9):,.0f}')
+
+
+if __name__ == '__main__':
+    check_parity()
+    if 'bench' in sys.argv[1:]:
+        benchmark()
@@ -1,9 +1,93 @@
+import datetime
+import logging
 from abc import ABC, abstractmethod
+from typing import List
+
+import numpy as np
+
+from tools.utils_basic import get_limit_prices
+from delegate.order_inflight import InflightOrders, SIDE_BUY, SIDE_SELL
+
+
+class BasketOrder:
+    """
+    篮子委托的一条腿，price 为现价，实际委托价和委托方式由 price_basket 统一算出
+    """
+    def __init__(
+        self,
+        code: str,
+        price: float,
+        last_close: float,
+        volume: int,
+        remark: str,
+        is_buy: bool,
+        market: bool = True,
+    ):
+        self.code = code
+        self.price = price
+        self.last_close = last_close
+        self.volume = volume
+        self.remark = remark
+        self.is_buy = is_buy
+        self.market = market
+
+        self.order_price = np.nan
+        self.record_price = np.nan     # 写入委托记录的价格：买入记现价，卖出记未按跌停调整的 现价-溢价
+        self.is_limit = False
+
+    def get_side(self) -> str:
+        if not self.is_buy:
+            return '卖出委托'
+        return '市买委托' if self.market else '限买委托'
+
+
+def price_basket(orders: List[BasketOrder], order_premium: float) -> None:
+    """
+    一次算出所有腿的委托价，规则与 BaseBuyer.order_buy / BaseSeller.order_sell 相同
+    买入价超过涨停价、卖出价低于跌停价时改挂涨跌停价的限价单
+    """
+    if len(orders) == 0:
+        return
+
+    codes = [order.code for order in orders]
+    price = np.array([order.price for order in orders], dtype=np.float64)
+    last_close = np.array([order.last_close for order in orders], dtype=np.float64)
+    is_buy = np.array([order.is_buy for order in orders], dtype=bool)
+    market = np.array([order.market for order in orders], dtype=bool)
+
+    up_limit = get_limit_prices(codes, last_close, up=True)
+    down_limit = get_limit_prices(codes, last_close, up=False)
+
+    buy_price = price + order_premium
+    sell_price = price - order_premium
+    over_up = buy_price > up_limit
+    under_down = sell_price < down_limit
+
+    order_price = np.where(
+        is_buy,
+        np.where(market & over_up, up_limit, np.minimum(buy_price, up_limit)),
+        np.where(under_down, down_limit, sell_price),
+    )
+    is_limit = np.where(is_buy, ~market | over_up, under_down)
+    record_price = np.where(is_buy, price, sell_price)
+
+    for i, order in enumerate(orders):
+        order.order_price = float(order_price[i])
+        order.record_price = float(record_price[i])
+        order.is_limit = bool(is_limit[i])
 
 
 class BaseDelegate(ABC):
     def __init__(self):
         self.callback = None
+        self.order_scheduler = None     # 设置后所有委托经调度器限速发出
+        self.inflight_orders = InflightOrders()
+
+    def dispatch_order(self, is_sell: bool, func, tokens: int = 1, **kwargs):
+        # 有调度器时排队发出并返回 Future，否则直接调用；tokens 为批量请求包含的委托笔数
+        if self.order_scheduler is None:
+            return func(**kwargs)
+        return self.order_scheduler.submit(is_sell, func, tokens=tokens, **kwargs)
 
     @abstractmethod
     def check_asset(self):
@@ -60,3 +144,63 @@ class BaseDelegate(ABC):
         strategy_name: str = 'non-name',
     ):
         pass
+
+    # ================
+    # 篮子委托
+    # ================
+    def submit_basket(
+        self,
+        orders: List[BasketOrder],
+        strategy_name: str = 'non-name',
+        order_premium: float = 0.0,
+    ) -> list:
+        """
+        一次定价、提交所有腿，委托记录一次写入、通知合并成一条
+        返回每条腿的委托结果，顺序与 orders 相同
+        """
+        orders = [
+            order for order in orders
+            if order.volume > 0 and self.inflight_orders.try_add(order.code, SIDE_BUY if order.is_buy else SIDE_SELL)
+        ]
+        if len(orders) == 0:
+            return []
+
+        price_basket(orders, order_premium)
+        results = self.submit_basket_legs(orders, strategy_name)
+
+        logging.warning('篮子委托 ' + ' '.join(
+            f'{order.get_side()}:{order.code}/{order.order_price:.3f}/{order.volume}股' for order in orders))
+        self.notify_basket(orders, strategy_name)
+
+        if self.callback is not None and hasattr(self.callback, 'record_orders'):
+            order_time = datetime.datetime.now().timestamp()
+            self.callback.record_orders([{
+                'order_time': order_time,
+                'code': order.code,
+                'price': order.record_price,
+                'volume': order.volume,
+                'side': order.get_side(),
+                'remark': order.remark,
+            } for order in orders])
+        return results
+
+    def submit_basket_legs(self, orders: List[BasketOrder], strategy_name: str) -> list:
+        # 默认逐条提交，支持批量或异步下单的子类重写
+        results = []
+        for order in orders:
+            if order.is_buy:
+                submit = self.order_limit_open if order.is_limit else self.order_market_open
+            else:
+                submit = self.order_limit_close if order.is_limit else self.order_market_close
+            results.append(submit(
+                code=order.code,
+                price=order.order_price,
+                volume=order.volume,
+                remark=order.remark,
+                strategy_name=strategy_name,
+            ))
+        return results
+
+    def notify_basket(self, orders: List[BasketOrder], strategy_name: str) -> None:
+        # 有消息通知的子类把整个篮子合并成一条消息
+        pass
@@ -1,15 +1,24 @@
 import datetime
 import threading
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 from gmtrade.api import *
 from gmtrade.pb.account_pb2 import Order, ExecRpt, AccountStatus
 
 from tools.utils_basic import gmsymbol_to_code
-from tools.utils_cache import record_deal, new_held, del_key, get_stock_codes_and_names
+from tools.utils_cache import record_deal, record_deals, new_held, del_key, get_stock_codes_and_names
 from tools.utils_ding import DingMessager
 
 
+# 委托终结的状态，之后不会再有成交
+final_order_status = {
+    OrderStatus_Filled,
+    OrderStatus_Canceled,
+    OrderStatus_Rejected,
+    OrderStatus_Expired,
+}
+
+
 class GmCallback:
     def __init__(
         self,
@@ -33,6 +42,7 @@ class GmCallback:
 
         self.code_name: Dict = get_stock_codes_and_names()
         self.debug: bool = debug
+        self.delegate = None
 
         GmCache.gm_callback = self
 
@@ -64,6 +74,22 @@ class GmCallback:
             volume=volume,
         )
 
+    def record_orders(self, rows: List[dict]):
+        # 篮子委托的记录一次写入，rows 的字段与 record_order 的参数相同
+        record_deals(
+            lock=self.lock_of_disk_cache,
+            path=self.path_deal,
+            rows=[{
+                'timestamp': row['order_time'],
+                'code': row['code'],
+                'name': self.code_name.get(row['code'], '(Unknown)'),
+                'order_type': row['side'],
+                'remark': row['remark'],
+                'price': round(row['price'], 2),
+                'volume': row['volume'],
+            } for row in rows],
+        )
+
     def on_execution_report(self, rpt: ExecRpt):
         """
             account_id: "189ca421-49db-11ef-9fa8-00163e022aa6"
@@ -112,6 +138,10 @@ class GmCallback:
         #     )
 
     def on_order_status(self, order: Order):
+        # 只释放本进程发出并按 cl_ord_id 绑定过的占位
+        if self.delegate is not None and order.status in final_order_status:
+            self.delegate.inflight_orders.release_order(order.cl_ord_id)
+
         if order.status == OrderStatus_Rejected:
             self.ding_messager.send_text(f'订单已拒绝:{order.symbol} {order.ord_rej_reason_detail}')
 
@@ -148,6 +178,9 @@ class GmCache:
 
 def on_trade_data_connected():
     print('[掘金回调]:交易服务已连接')
+    # 断线期间可能漏掉委托终结推送，重连后按未完成委托清理在途占位
+    if GmCache.gm_callback is not None and GmCache.gm_callback.delegate is not None:
+        GmCache.gm_callback.delegate.sync_inflight_orders()
 
 
 def on_trade_data_disconnected():
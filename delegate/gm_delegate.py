@@ -1,10 +1,15 @@
-from typing import List
+import time
+from threading import Thread
+from concurrent.futures import Future
+from typing import List, Tuple
 
 from gmtrade.api import *
 from gmtrade.pb.account_pb2 import Cash, Position, Order
 
-from delegate.base_delegate import BaseDelegate
-from delegate.gm_callback import GmCallback
+from delegate.base_delegate import BaseDelegate, BasketOrder
+from delegate.order_inflight import SIDE_BUY, SIDE_SELL
+from delegate.gm_callback import GmCallback, final_order_status
+from delegate.order_scheduler import OrderScheduler, default_order_rate
 
 from credentials import GM_ACCOUNT_ID, GM_CLIENT_TOKEN
 
@@ -14,6 +19,8 @@ from tools.utils_ding import DingMessager
 
 GM_SERVER_HOST = 'api.myquant.cn:9000'
 
+default_inflight_duration = 60     # 在途委托与掘金未完成委托对账的间隔秒数
+
 
 class GmAsset:
     def __init__(self, cash: Cash):
@@ -45,7 +52,14 @@ class GmPosition:
 
 
 class GmDelegate(BaseDelegate):
-    def __init__(self, account_id: str = None, callback: GmCallback = None, ding_messager: DingMessager = None):
+    def __init__(
+        self,
+        account_id: str = None,
+        callback: GmCallback = None,
+        ding_messager: DingMessager = None,
+        open_order_scheduler: bool = False,     # 是否限速发送委托，卖单优先
+        order_rate: float = default_order_rate,
+    ):
         super().__init__()
         self.account_id = '**' + str(account_id)[-4:]
         self.ding_messager = ding_messager
@@ -58,8 +72,32 @@ class GmDelegate(BaseDelegate):
 
         if callback is not None:
             self.callback = callback
+            self.callback.delegate = self
             self.callback.register_callback()
 
+        if open_order_scheduler:
+            self.order_scheduler = OrderScheduler(order_rate)
+        Thread(target=self.keep_inflight_synced, daemon=True).start()
+
+    def sync_inflight_orders(self) -> None:
+        # 终结回调可能丢失，按掘金的未完成委托释放已终结或查不到的在途占位
+        checked = self.inflight_orders.get_bound_orders()
+        if len(checked) == 0:
+            return
+        try:
+            orders = get_unfinished_orders(self.account)
+        except Exception as e:
+            print('在途委托对账失败：', e)
+            return
+        released = self.inflight_orders.sync(checked, [order.cl_ord_id for order in orders])
+        if released > 0:
+            print(f'在途委托对账释放 {released} 笔')
+
+    def keep_inflight_synced(self) -> None:
+        while True:
+            time.sleep(default_inflight_duration)
+            self.sync_inflight_orders()
+
     def shutdown(self):
         self.callback.unregister_callback()
 
@@ -114,7 +152,9 @@ class GmDelegate(BaseDelegate):
                 f'{code}委买{volume}股{price:.2f}元',
                 '')
 
-        orders = order_volume(
+        orders = self.dispatch_order(
+            False,
+            order_volume,
             symbol=code_to_gmsymbol(code),
             price=price,
             volume=volume,
@@ -123,7 +163,7 @@ class GmDelegate(BaseDelegate):
             order_qualifier=OrderQualifier_B5TC,
             position_effect=PositionEffect_Open,
         )
-        return orders
+        return self.track_orders(orders, [(code, SIDE_BUY)])
 
     def order_market_close(
         self,
@@ -140,7 +180,9 @@ class GmDelegate(BaseDelegate):
                 f'{code}委卖{volume}股{price:.2f}元',
                 '')
 
-        orders = order_volume(
+        orders = self.dispatch_order(
+            True,
+            order_volume,
             symbol=code_to_gmsymbol(code),
             price=price,
             volume=volume,
@@ -149,7 +191,7 @@ class GmDelegate(BaseDelegate):
             order_qualifier=OrderQualifier_B5TC,
             position_effect=PositionEffect_Close,
         )
-        return orders
+        return self.track_orders(orders, [(code, SIDE_SELL)])
 
     def order_limit_open(
         self,
@@ -190,7 +232,9 @@ class GmDelegate(BaseDelegate):
                 f'{code}委买{volume}股{price:.2f}元',
                 '')
 
-        orders = order_volume(
+        orders = self.dispatch_order(
+            False,
+            order_volume,
             symbol=code_to_gmsymbol(code),
             price=price,
             volume=volume,
@@ -198,7 +242,7 @@ class GmDelegate(BaseDelegate):
             order_type=OrderType_Limit,
             position_effect=PositionEffect_Open,
         )
-        return orders
+        return self.track_orders(orders, [(code, SIDE_BUY)])
 
     def order_limit_close(
         self,
@@ -215,7 +259,9 @@ class GmDelegate(BaseDelegate):
                 f'{code}委卖{volume}股{price:.2f}元',
                 '')
 
-        orders = order_volume(
+        orders = self.dispatch_order(
+            True,
+            order_volume,
             symbol=code_to_gmsymbol(code),
             price=price,
             volume=volume,
@@ -223,7 +269,67 @@ class GmDelegate(BaseDelegate):
             order_type=OrderType_Limit,
             position_effect=PositionEffect_Close,
         )
-        return orders
+        return self.track_orders(orders, [(code, SIDE_SELL)])
+
+    def submit_basket_legs(self, orders: List[BasketOrder], strategy_name: str) -> list:
+        # 没有调度器时整个篮子一次 order_batch 请求提交
+        # 有调度器时按令牌桶容量切块，每块按腿数扣令牌，返回每块的 Future
+        legs = []
+        for order in orders:
+            leg = {
+                'symbol': code_to_gmsymbol(order.code),
+                'price': order.order_price,
+                'volume': order.volume,
+                'side': OrderSide_Buy if order.is_buy else OrderSide_Sell,
+                'order_type': OrderType_Limit if order.is_limit else OrderType_Market,
+                'position_effect': PositionEffect_Open if order.is_buy else PositionEffect_Close,
+            }
+            if not order.is_limit:
+                leg['order_qualifier'] = OrderQualifier_B5TC
+            legs.append(leg)
+        keys = [(order.code, SIDE_BUY if order.is_buy else SIDE_SELL) for order in orders]
+        if self.order_scheduler is None:
+            return self.track_orders(order_batch(order_infos=legs), keys)
+
+        size = max(int(self.order_scheduler.bucket.capacity), 1)
+        return [
+            self.track_orders(self.dispatch_order(
+                not all(order.is_buy for order in orders[i:i + size]),
+                order_batch,
+                tokens=len(legs[i:i + size]),
+                order_infos=legs[i:i + size],
+            ), keys[i:i + size])
+            for i in range(0, len(legs), size)
+        ]
+
+    def track_orders(self, result, keys: List[Tuple[str, str]]):
+        # 本进程发出的委托按 cl_ord_id 绑定在途占位，开启限速时等 Future 完成后再绑定
+        if isinstance(result, Future):
+            result.add_done_callback(
+                lambda future: self.bind_orders(None if future.exception() is not None else future.result(), keys))
+        else:
+            self.bind_orders(result, keys)
+        return result
+
+    def bind_orders(self, orders: List[Order], keys: List[Tuple[str, str]]) -> None:
+        bound = set()
+        for order in orders or []:
+            key = (gmsymbol_to_code(order.symbol), SIDE_SELL if order.side == OrderSide_Sell else SIDE_BUY)
+            if order.status not in final_order_status and self.inflight_orders.bind(order.cl_ord_id, *key):
+                bound.add(key)
+        # 没拿到委托回执或回执已终结的腿直接释放占位
+        for key in keys:
+            if key not in bound:
+                self.inflight_orders.release(*key)
+
+    def notify_basket(self, orders: List[BasketOrder], strategy_name: str) -> None:
+        if self.ding_messager is None:
+            return
+        lines = [
+            f'[{order.remark}]{order.code}{"委买" if order.is_buy else "委卖"}{order.volume}股{order.order_price:.2f}元'
+            for order in orders
+        ]
+        self.ding_messager.send_text(f'[{self.account_id}]{strategy_name}:篮子委托{len(orders)}笔\n' + '\n'.join(lines), '')
 
 
 def is_position_holding(position: GmPosition) -> bool:
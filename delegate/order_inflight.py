@@ -0,0 +1,125 @@
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+
+default_inflight_ttl = 30.0     # 占位后迟迟拿不到 order_id（请求丢失、没有回报）时自动放行的秒数
+default_finished_capacity = 4096    # 记录多少个已终结的 order_id，处理终结回调比 bind 先到的情况
+
+SIDE_BUY = 'buy'
+SIDE_SELL = 'sell'
+
+
+class InflightOrders:
+    """
+    按 (code, 方向) 索引的在途委托，同一只股票同一方向同时只允许一笔
+    下单前 try_add 占位，拿到本委托的 order_id 后 bind，之后一直保留到该委托终结（全部成交、撤单、废单、报错）
+    只有还没 bind 的占位会在 ttl 后过期；release_order 只释放本进程 bind 过的 order_id，手工单和其他策略的委托不受影响
+    隔日自动清空；终结回调丢失时由 sync 按查询到的委托状态清理
+    """
+    def __init__(self, ttl: float = default_inflight_ttl, finished_capacity: int = default_finished_capacity):
+        self.ttl = ttl
+        self.finished_capacity = finished_capacity
+        self.lock = threading.Lock()
+        self.expires: Dict[Tuple[str, str], float] = {}        # (code, 方向) -> 过期时间，bind 后为 inf
+        self.key_orders: Dict[Tuple[str, str], object] = {}    # (code, 方向) -> 当前占位绑定的 order_id
+        self.order_keys: Dict[object, Tuple[str, str]] = {}    # order_id -> (code, 方向)
+        self.finished: OrderedDict[object, None] = OrderedDict()   # 终结回调先于 bind 到达的 order_id
+        self.day = datetime.date.today()
+
+    def _roll_day(self) -> None:
+        # 调用方已持有 self.lock，跨日后前一天的委托都已失效
+        today = datetime.date.today()
+        if today != self.day:
+            self.day = today
+            self._clear()
+
+    def _clear(self) -> None:
+        # 调用方已持有 self.lock
+        self.expires.clear()
+        self.key_orders.clear()
+        self.order_keys.clear()
+        self.finished.clear()
+
+    def clear(self) -> None:
+        with self.lock:
+            self._clear()
+
+    def try_add(self, code: str, side: str) -> bool:
+        now = time.monotonic()
+        key = (code, side)
+        with self.lock:
+            self._roll_day()
+            expire = self.expires.get(key)
+            if expire is not None and expire > now:
+                return False
+            self._drop(key)
+            self.expires[key] = now + self.ttl
+            return True
+
+    def contains(self, code: str, side: str) -> bool:
+        with self.lock:
+            self._roll_day()
+            expire = self.expires.get((code, side))
+        return expire is not None and expire > time.monotonic()
+
+    def get_bound_orders(self) -> Dict[object, Tuple[str, str]]:
+        with self.lock:
+            return dict(self.order_keys)
+
+    def sync(self, checked_order_ids: Iterable, live_order_ids: Iterable) -> int:
+        """
+        checked_order_ids 为查询前 get_bound_orders 的快照，live_order_ids 为查询到的未终结委托
+        快照里已不在途（已终结或查不到）的释放，查询期间新绑定的不受影响，返回释放数
+        """
+        live = set(live_order_ids)
+        with self.lock:
+            self._roll_day()
+            stale = [order_id for order_id in checked_order_ids if order_id in self.order_keys and order_id not in live]
+            for order_id in stale:
+                self._drop(self.order_keys[order_id])
+            return len(stale)
+
+    def bind(self, order_id, code: str, side: str) -> bool:
+        # 本进程发出的委托拿到 order_id 后调用，占位不再过期，返回是否绑定成功
+        key = (code, side)
+        with self.lock:
+            if key not in self.expires or key in self.key_orders:
+                return False
+            if order_id in self.finished:
+                # 终结回调已经先到了
+                del self.finished[order_id]
+                self._drop(key)
+                return False
+            self.expires[key] = float('inf')
+            self.key_orders[key] = order_id
+            self.order_keys[order_id] = key
+            return True
+
+    def release(self, code: str, side: str) -> None:
+        # 本进程的委托没发出去或没拿到 order_id 时释放占位，已绑定的只能由 release_order 释放
+        key = (code, side)
+        with self.lock:
+            if key not in self.key_orders:
+                self.expires.pop(key, None)
+
+    def release_order(self, order_id) -> Optional[Tuple[str, str]]:
+        # 委托终结时调用，只释放绑定到该 order_id 的占位
+        with self.lock:
+            key = self.order_keys.get(order_id)
+            if key is None:
+                self.finished[order_id] = None
+                while len(self.finished) > self.finished_capacity:
+                    self.finished.popitem(last=False)
+                return None
+            self._drop(key)
+            return key
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        # 调用方已持有 self.lock
+        self.expires.pop(key, None)
+        order_id = self.key_orders.pop(key, None)
+        if order_id is not None:
+            self.order_keys.pop(order_id, None)
@@ -0,0 +1,75 @@
+import time
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import Future
+from queue import PriorityQueue
+from typing import Callable, Dict
+
+import numpy as np
+
+from tools.utils_limiter import TokenBucket
+
+
+default_order_rate = 5.0        # 每秒最多发出的委托数
+default_order_burst = 5         # 允许的瞬时突发委托数
+default_delay_window = 1000     # 统计最近多少笔委托的排队延迟
+
+PRIORITY_SELL = 0               # 卖单（止损）优先于买单
+PRIORITY_BUY = 1
+
+
+class OrderScheduler:
+    """
+    委托发送调度：所有委托进优先队列，由单个线程按令牌桶限速发出
+    卖单排在买单前面，同优先级按提交顺序，记录每笔委托的排队延迟
+    """
+    def __init__(self, rate: float = default_order_rate, burst: float = default_order_burst):
+        self.bucket = TokenBucket(rate, burst)
+        self.queue = PriorityQueue()
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.delays = deque(maxlen=default_delay_window)
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def submit(self, is_sell: bool, func: Callable, *args, tokens: int = 1, **kwargs) -> Future:
+        # tokens 为这次请求包含的委托笔数，批量下单按笔数扣令牌
+        future = Future()
+        priority = PRIORITY_SELL if is_sell else PRIORITY_BUY
+        self.queue.put((priority, next(self.counter), time.monotonic(), tokens, func, args, kwargs, future))
+        return future
+
+    def run(self) -> None:
+        while True:
+            # 令牌不够时放回队列等令牌，等到后重新取队首，等待期间新到的卖单仍排在前面
+            item = self.queue.get()
+            _, _, enqueued_at, tokens, func, args, kwargs, future = item
+            tokens = min(tokens, self.bucket.capacity)
+            if not self.bucket.try_acquire(tokens):
+                self.queue.put(item)
+                self.bucket.wait(tokens)
+                continue
+            with self.lock:
+                self.delays.append((time.monotonic() - enqueued_at) * 1000)
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                print('委托发送失败：', e)
+                future.set_exception(e)
+
+    def pending_count(self) -> int:
+        return self.queue.qsize()
+
+    def get_delay_stats(self) -> Dict[str, float]:
+        # 最近若干笔委托从提交到发出的排队毫秒数
+        with self.lock:
+            values = np.array(self.delays, dtype=np.float64)
+        if len(values) == 0:
+            return {'count': 0, 'pending': self.pending_count()}
+        return {
+            'count': len(values),
+            'pending': self.pending_count(),
+            'mean': float(values.mean()),
+            'p95': float(np.percentile(values, 95)),
+            'max': float(values.max()),
+        }
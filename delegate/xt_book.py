@@ -0,0 +1,92 @@
+import threading
+from typing import Dict, List, Optional
+
+from xtquant.xttype import XtPosition, XtOrder, XtAsset, XtTrade
+
+
+class XtAccountBook:
+    """
+    持仓、资产、当日委托的内存副本
+    连接后查询一次作为初值，之后由 QMT 主推的持仓/资产/委托回调更新，定时对账纠正漏掉的主推
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.positions: Dict[str, XtPosition] = {}
+        self.orders: Dict[int, XtOrder] = {}
+        self.asset: Optional[XtAsset] = None
+        self.ready = False
+        self.stale = threading.Event()          # 有成交后提前唤醒对账线程
+
+        # 对账查询期间收到的主推，比查询结果新，seed 时覆盖回去
+        self.syncing = False
+        self.sync_positions: Dict[str, XtPosition] = {}
+        self.sync_orders: Dict[int, XtOrder] = {}
+        self.sync_asset: Optional[XtAsset] = None
+
+    def begin_sync(self) -> None:
+        # 发起对账查询前调用，之后到达的主推会在 seed 时重放
+        with self.lock:
+            self.syncing = True
+            self.sync_positions = {}
+            self.sync_orders = {}
+            self.sync_asset = None
+
+    def cancel_sync(self) -> None:
+        with self.lock:
+            self.syncing = False
+
+    def seed(self, positions: List[XtPosition], asset: XtAsset, orders: List[XtOrder]) -> None:
+        with self.lock:
+            self.positions = {position.stock_code: position for position in positions}
+            self.orders = {order.order_id: order for order in orders}
+            self.asset = asset
+            if self.syncing:
+                self.positions.update(self.sync_positions)
+                self.orders.update(self.sync_orders)
+                if self.sync_asset is not None:
+                    self.asset = self.sync_asset
+            self.syncing = False
+            self.ready = True
+
+    def reset(self) -> None:
+        # 断线后内存数据不再可信，等重连后重新 seed
+        with self.lock:
+            self.ready = False
+
+    def on_position(self, position: XtPosition) -> None:
+        with self.lock:
+            self.positions[position.stock_code] = position
+            if self.syncing:
+                self.sync_positions[position.stock_code] = position
+
+    def on_asset(self, asset: XtAsset) -> None:
+        with self.lock:
+            self.asset = asset
+            if self.syncing:
+                self.sync_asset = asset
+
+    def on_order(self, order: XtOrder) -> None:
+        with self.lock:
+            self.orders[order.order_id] = order
+            if self.syncing:
+                self.sync_orders[order.order_id] = order
+
+    def on_trade(self, trade: XtTrade) -> None:
+        # 成交后持仓和资产会另有主推，这里只提醒对账线程尽快核对一次，防止主推丢失
+        self.stale.set()
+
+    def get_positions(self) -> List[XtPosition]:
+        with self.lock:
+            return list(self.positions.values())
+
+    def get_asset(self) -> Optional[XtAsset]:
+        with self.lock:
+            return self.asset
+
+    def get_orders(self) -> List[XtOrder]:
+        with self.lock:
+            return list(self.orders.values())
+
+    def get_order(self, order_id: int) -> Optional[XtOrder]:
+        with self.lock:
+            return self.orders.get(order_id)
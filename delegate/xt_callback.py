@@ -1,13 +1,29 @@
 import threading
 import datetime
 import logging
+from typing import List
 
 from xtquant import xtconstant
 from xtquant.xttrader import XtQuantTraderCallback
-from xtquant.xttype import XtOrder, XtTrade, XtOrderError, XtCancelError, XtOrderResponse, XtCancelOrderResponse
+from xtquant.xttype import XtOrder, XtTrade, XtOrderError, XtCancelError, XtOrderResponse, XtCancelOrderResponse, \
+    XtPosition, XtAsset
 
-from tools.utils_cache import record_deal, new_held, del_key, get_stock_codes_and_names
+from tools.utils_cache import record_deal, record_deals, new_held, del_key, get_stock_codes_and_names
 from tools.utils_ding import DingMessager
+from delegate.order_inflight import SIDE_BUY, SIDE_SELL
+
+
+# 委托终结的状态，之后不会再有成交
+final_order_status = {
+    xtconstant.ORDER_PART_CANCEL,
+    xtconstant.ORDER_CANCELED,
+    xtconstant.ORDER_SUCCEEDED,
+    xtconstant.ORDER_JUNK,
+}
+
+
+def get_order_side(order_type: int) -> str:
+    return SIDE_SELL if order_type == xtconstant.STOCK_SELL else SIDE_BUY
 
 
 class XtBaseCallback(XtQuantTraderCallback):
@@ -19,28 +35,92 @@ class XtBaseCallback(XtQuantTraderCallback):
         print(datetime.datetime.now(), '连接丢失，断线重连中...')
         if self.delegate is not None:
             self.delegate.xt_trader = None
+        book = self.get_account_book()
+        if book is not None:
+            book.reset()
+
+    def get_account_book(self):
+        # 子类重写 on_stock_* 时需先调用 super() 保持内存持仓同步
+        if self.delegate is None:
+            return None
+        return getattr(self.delegate, 'account_book', None)
+
+    def on_stock_position(self, position: XtPosition):
+        book = self.get_account_book()
+        if book is not None:
+            book.on_position(position)
+
+    def on_stock_asset(self, asset: XtAsset):
+        book = self.get_account_book()
+        if book is not None:
+            book.on_asset(asset)
+
+    def on_stock_order(self, order: XtOrder):
+        book = self.get_account_book()
+        if book is not None:
+            book.on_order(order)
+
+        # 只释放本进程发出并绑定过 order_id 的占位，手工单和其他策略的委托不影响
+        inflight = self.get_inflight_orders()
+        if inflight is not None and order.order_status in final_order_status:
+            inflight.release_order(order.order_id)
+
+    def on_stock_trade(self, trade: XtTrade):
+        book = self.get_account_book()
+        if book is not None:
+            book.on_trade(trade)
+
+    def on_order_stock_async_response(self, res: XtOrderResponse):
+        registry = self.get_order_registry()
+        if registry is None:
+            return
+        # 在途占位由登记表的 on_acknowledge 绑定或释放，回报早于登记时同样生效
+        registry.on_response(res)
+
+    def on_order_error(self, order_error: XtOrderError):
+        registry = self.get_order_registry()
+        if registry is not None:
+            registry.on_error(order_error)
+
+        inflight = self.get_inflight_orders()
+        if inflight is not None:
+            inflight.release_order(order_error.order_id)
+
+    def get_order_registry(self):
+        if self.delegate is None:
+            return None
+        return getattr(self.delegate, 'order_registry', None)
+
+    def get_inflight_orders(self):
+        if self.delegate is None:
+            return None
+        return getattr(self.delegate, 'inflight_orders', None)
 
 
 class XtDefaultCallback(XtBaseCallback):
     def on_stock_trade(self, trade: XtTrade):
+        super().on_stock_trade(trade)
         print(
             datetime.datetime.now(),
             f'成交回调 id:{trade.order_id} code:{trade.stock_code} remark:{trade.order_remark}',
         )
 
     def on_stock_order(self, order: XtOrder):
+        super().on_stock_order(order)
         print(
             datetime.datetime.now(),
             f'委托回调 id:{order.order_id} code:{order.stock_code} remark:{order.order_remark}',
         )
 
     def on_order_stock_async_response(self, res: XtOrderResponse):
+        super().on_order_stock_async_response(res)
         print(
             datetime.datetime.now(),
             f'异步委托回调 id:{res.order_id} sysid:{res.error_msg} remark:{res.order_remark}',
         )
 
     def on_order_error(self, order_error: XtOrderError):
+        super().on_order_error(order_error)
         print(
             datetime.datetime.now(),
             f'委托报错回调 id:{order_error.order_id} error_id:{order_error.error_id} error_msg:{order_error.error_msg}',
@@ -103,7 +183,24 @@ class XtCustomCallback(XtBaseCallback):
             volume=volume,
         )
 
+    def record_orders(self, rows: List[dict]):
+        # 篮子委托的记录一次写入，rows 的字段与 record_order 的参数相同
+        record_deals(
+            lock=self.lock_of_disk_cache,
+            path=self.path_deal,
+            rows=[{
+                'timestamp': row['order_time'],
+                'code': row['code'],
+                'name': self.code_name.get(row['code'], '(Unknown)'),
+                'order_type': row['side'],
+                'remark': row['remark'],
+                'price': round(row['price'], 2),
+                'volume': row['volume'],
+            } for row in rows],
+        )
+
     def on_stock_trade(self, trade: XtTrade):
+        super().on_stock_trade(trade)
         stock_code = trade.stock_code
         traded_volume = trade.traded_volume
         traded_price = trade.traded_price
@@ -153,9 +250,11 @@ class XtCustomCallback(XtBaseCallback):
 
 
     def on_order_stock_async_response(self, res: XtOrderResponse):
+        super().on_order_stock_async_response(res)
         log = f'异步委托回调 id:{res.order_id} sysid:{res.error_msg} remark:{res.order_remark}',
         logging.warning(log)
 
     def on_order_error(self, err: XtOrderError):
+        super().on_order_error(err)
         log = f'委托报错 id:{err.order_id} error_id:{err.error_id} error_msg:{err.error_msg}'
         logging.warning(log)
@@ -1,6 +1,6 @@
 import time
 from threading import Thread
-from typing import List
+from typing import List, Optional, Union
 
 from xtquant import xtconstant
 from xtquant.xtdata import get_client, get_full_tick
@@ -9,8 +9,11 @@ from xtquant.xttype import StockAccount, XtPosition, XtOrder, XtAsset
 
 from credentials import *
 from tools.utils_basic import get_code_exchange
-from delegate.base_delegate import BaseDelegate
-from delegate.xt_callback import XtDefaultCallback
+from delegate.base_delegate import BaseDelegate, BasketOrder
+from delegate.xt_callback import XtDefaultCallback, get_order_side
+from delegate.xt_book import XtAccountBook
+from delegate.xt_orders import XtOrderRegistry, XtPendingOrder
+from delegate.order_scheduler import OrderScheduler, default_order_rate
 
 
 default_client_path = QMT_CLIENT_PATH
@@ -18,12 +21,28 @@ default_account_id = QMT_ACCOUNT_ID
 
 default_reconnect_duration = 60
 default_wait_duration = 15
+default_reconcile_duration = 30    # 内存持仓资产与 QMT 对账的间隔秒数
+default_inflight_duration = 60     # 在途委托与 QMT 未终结委托对账的间隔秒数
 
 
 class XtDelegate(BaseDelegate):
-    def __init__(self, account_id: str = None, client_path: str = None, callback: object = None):
+    def __init__(
+        self,
+        account_id: str = None,
+        client_path: str = None,
+        callback: object = None,
+        open_account_book: bool = False,     # 是否在内存中维护持仓资产委托，查询时不再请求 QMT
+        open_async_order: bool = False,      # 是否用异步委托下单，不等待 QMT 回报
+        open_order_scheduler: bool = False,  # 是否限速发送委托，卖单优先
+        order_rate: float = default_order_rate,
+    ):
         super().__init__()
         self.xt_trader = None
+        self.account_book = XtAccountBook() if open_account_book else None
+        self.open_async_order = open_async_order
+        self.order_registry = XtOrderRegistry(on_acknowledge=self.bind_pending_order)
+        if open_order_scheduler:
+            self.order_scheduler = OrderScheduler(order_rate)
 
         if client_path is None:
             client_path = default_client_path
@@ -36,6 +55,9 @@ class XtDelegate(BaseDelegate):
         self.connect(self.callback)
         # 保证QMT持续连接
         Thread(target=self.keep_connected).start()
+        if self.account_book is not None:
+            Thread(target=self.keep_reconciled, daemon=True).start()
+        Thread(target=self.keep_inflight_synced, daemon=True).start()
 
     def connect(self, callback: object) -> (XtQuantTrader, bool):
         session_id = int(time.time())  # 生成session id 整数类型 同时运行的策略不能重复
@@ -71,6 +93,8 @@ class XtDelegate(BaseDelegate):
         print('成功!')
 
         print('连接完毕。')
+        self.sync_account_book()
+        self.sync_inflight_orders()
         return self.xt_trader, True
 
     def reconnect(self) -> None:
@@ -88,6 +112,54 @@ class XtDelegate(BaseDelegate):
             time.sleep(default_reconnect_duration)
             self.reconnect()
 
+    def sync_account_book(self) -> None:
+        # 查询一次 QMT 覆盖内存副本
+        if self.account_book is None or self.xt_trader is None:
+            return
+        self.account_book.begin_sync()
+        try:
+            positions = self.xt_trader.query_stock_positions(self.account)
+            asset = self.xt_trader.query_stock_asset(self.account)
+            orders = self.xt_trader.query_stock_orders(self.account, False)
+        except Exception as e:
+            print('持仓对账失败：', e)
+            self.account_book.cancel_sync()
+            return
+        if positions is None or asset is None or orders is None:
+            self.account_book.cancel_sync()
+            return
+        # 查询期间到达的主推比查询结果新，seed 时会覆盖回去
+        self.account_book.seed(positions, asset, orders)
+
+    def keep_reconciled(self) -> None:
+        while True:
+            self.account_book.stale.wait(default_reconcile_duration)
+            self.account_book.stale.clear()
+            self.sync_account_book()
+
+    def sync_inflight_orders(self) -> None:
+        # 终结回调可能丢失（断线期间、推送遗漏），按 QMT 的可撤委托释放已终结或查不到的在途占位
+        if self.xt_trader is None:
+            return
+        checked = self.inflight_orders.get_bound_orders()
+        if len(checked) == 0:
+            return
+        try:
+            orders = self.xt_trader.query_stock_orders(self.account, True)
+        except Exception as e:
+            print('在途委托对账失败：', e)
+            return
+        if orders is None:
+            return
+        released = self.inflight_orders.sync(checked, [order.order_id for order in orders])
+        if released > 0:
+            print(f'在途委托对账释放 {released} 笔')
+
+    def keep_inflight_synced(self) -> None:
+        while True:
+            time.sleep(default_inflight_duration)
+            self.sync_inflight_orders()
+
     def shutdown(self):
         self.xt_trader.stop()
         self.xt_trader = None
@@ -101,9 +173,42 @@ class XtDelegate(BaseDelegate):
         price: float,
         strategy_name: str,
         order_remark: str,
-    ) -> bool:
+    ):
+        return self.dispatch_order(
+            order_type == xtconstant.STOCK_SELL,
+            self.order_submit_now,
+            stock_code=stock_code,
+            order_type=order_type,
+            order_volume=order_volume,
+            price_type=price_type,
+            price=price,
+            strategy_name=strategy_name,
+            order_remark=order_remark,
+        )
+
+    def order_submit_now(
+        self,
+        stock_code: str,
+        order_type: int,
+        order_volume: int,
+        price_type: int,
+        price: float,
+        strategy_name: str,
+        order_remark: str,
+    ) -> Union[bool, Optional[XtPendingOrder]]:
+        if self.open_async_order:
+            return self.order_submit_async(
+                stock_code=stock_code,
+                order_type=order_type,
+                order_volume=order_volume,
+                price_type=price_type,
+                price=price,
+                strategy_name=strategy_name,
+                order_remark=order_remark,
+            )
+
         if self.xt_trader is not None:
-            self.xt_trader.order_stock(
+            order_id = self.xt_trader.order_stock(
                 account=self.account,
                 stock_code=stock_code,
                 order_type=order_type,
@@ -113,10 +218,23 @@ class XtDelegate(BaseDelegate):
                 strategy_name=strategy_name,
                 order_remark=order_remark,
             )
+            self.bind_order_id(order_id, stock_code, order_type)
             return True
         else:
             return False
 
+    def bind_order_id(self, order_id: Optional[int], stock_code: str, order_type: int) -> None:
+        # 只有本进程发出的委托会绑定 order_id，终结回调据此释放在途占位
+        side = get_order_side(order_type)
+        if order_id is not None and order_id > 0:
+            self.inflight_orders.bind(order_id, stock_code, side)
+        else:
+            self.inflight_orders.release(stock_code, side)
+
+    def bind_pending_order(self, pending: XtPendingOrder) -> None:
+        # 异步委托拿到回报后由登记表调用，回报早于登记时也会调用
+        self.bind_order_id(pending.order_id if pending.ok else None, pending.code, pending.order_type)
+
     def order_submit_async(
         self,
         stock_code: str,
@@ -126,9 +244,11 @@ class XtDelegate(BaseDelegate):
         price: float,
         strategy_name: str,
         order_remark: str,
-    ) -> bool:
+    ) -> Optional[XtPendingOrder]:
+        # 发出后立即返回，回报由 on_order_stock_async_response 写回，可用 wait_orders 等待一篮子委托
         if self.xt_trader is not None:
-            self.xt_trader.order_stock_async(
+            pending = XtPendingOrder(stock_code, order_type, order_volume, price, order_remark)
+            seq = self.xt_trader.order_stock_async(
                 account=self.account,
                 stock_code=stock_code,
                 order_type=order_type,
@@ -138,9 +258,15 @@ class XtDelegate(BaseDelegate):
                 strategy_name=strategy_name,
                 order_remark=order_remark,
             )
-            return True
+            if seq is None or seq <= 0:
+                pending.error = f'委托请求失败 seq:{seq}'
+                pending.future.set_result(pending)
+                self.bind_pending_order(pending)
+                return pending
+            self.order_registry.register(pending, seq)
+            return pending
         else:
-            return False
+            return None
 
     def order_cancel(self, order_id) -> int:
         cancel_result = self.xt_trader.cancel_order_stock(self.account, order_id)
@@ -150,26 +276,39 @@ class XtDelegate(BaseDelegate):
         cancel_result = self.xt_trader.cancel_order_stock_async(self.account, order_id)
         return cancel_result
 
+    def use_account_book(self) -> bool:
+        return self.account_book is not None and self.account_book.ready
+
     def check_asset(self) -> XtAsset:
         if self.xt_trader is not None:
+            if self.use_account_book():
+                return self.account_book.get_asset()
             return self.xt_trader.query_stock_asset(self.account)
         else:
             raise Exception('xt_trader为空')
 
     def check_order(self, order_id) -> XtOrder:
         if self.xt_trader is not None:
+            if self.use_account_book():
+                order = self.account_book.get_order(order_id)
+                if order is not None:
+                    return order
             return self.xt_trader.query_stock_order(self.account, order_id)
         else:
             raise Exception('xt_trader为空')
 
     def check_orders(self) -> List[XtOrder]:
         if self.xt_trader is not None:
+            if self.use_account_book():
+                return self.account_book.get_orders()
             return self.xt_trader.query_stock_orders(self.account, False)
         else:
             raise Exception('xt_trader为空')
 
     def check_positions(self) -> List[XtPosition]:
         if self.xt_trader is not None:
+            if self.use_account_book():
+                return self.account_book.get_positions()
             return self.xt_trader.query_stock_positions(self.account)
         else:
             raise Exception('xt_trader为空')
@@ -214,16 +353,9 @@ class XtDelegate(BaseDelegate):
         remark: str,
         strategy_name: str = 'non-name',
     ):
-        price_type = xtconstant.LATEST_PRICE
-
-        if get_code_exchange(code) == 'SZ':
-            price_type = xtconstant.MARKET_SZ_CONVERT_5_CANCEL
-            price = -1
-        if get_code_exchange(code) == 'SH':
-            price_type = xtconstant.MARKET_PEER_PRICE_FIRST
-            price = price
+        price_type, price = get_market_price_type(code, price)
 
-        self.order_submit(
+        return self.order_submit(
             stock_code=code,
             order_type=xtconstant.STOCK_BUY,
             order_volume=volume,
@@ -241,16 +373,9 @@ class XtDelegate(BaseDelegate):
         remark: str,
         strategy_name: str = 'non-name',
     ):
-        price_type = xtconstant.LATEST_PRICE
+        price_type, price = get_market_price_type(code, price)
 
-        if get_code_exchange(code) == 'SZ':
-            price_type = xtconstant.MARKET_SZ_CONVERT_5_CANCEL
-            price = -1
-        if get_code_exchange(code) == 'SH':
-            price_type = xtconstant.MARKET_PEER_PRICE_FIRST
-            price = price
-
-        self.order_submit(
+        return self.order_submit(
             stock_code=code,
             order_type=xtconstant.STOCK_SELL,
             order_volume=volume,
@@ -268,7 +393,7 @@ class XtDelegate(BaseDelegate):
         remark: str,
         strategy_name: str = 'non-name',
     ):
-        self.order_submit(
+        return self.order_submit(
             stock_code=code,
             price=price,
             order_volume=volume,
@@ -286,7 +411,7 @@ class XtDelegate(BaseDelegate):
         remark: str,
         strategy_name: str = 'non-name',
     ):
-        self.order_submit(
+        return self.order_submit(
             stock_code=code,
             price=price,
             order_volume=volume,
@@ -296,6 +421,41 @@ class XtDelegate(BaseDelegate):
             order_remark=remark,
         )
 
+    def submit_basket_legs(self, orders: List[BasketOrder], strategy_name: str) -> list:
+        # 逐条经 order_submit_now 发出，同步或异步由 open_async_order 决定
+        # 异步时不等 QMT 回报，可用 wait_orders 等待一篮子委托；开启限速时返回 Future
+        results = []
+        for order in orders:
+            if order.is_limit:
+                price_type, price = xtconstant.FIX_PRICE, order.order_price
+            else:
+                price_type, price = get_market_price_type(order.code, order.order_price)
+            results.append(self.dispatch_order(
+                not order.is_buy,
+                self.order_submit_now,
+                stock_code=order.code,
+                order_type=xtconstant.STOCK_BUY if order.is_buy else xtconstant.STOCK_SELL,
+                order_volume=order.volume,
+                price_type=price_type,
+                price=price,
+                strategy_name=strategy_name,
+                order_remark=order.remark,
+            ))
+        return results
+
+
+def get_market_price_type(code: str, price: float) -> (int, float):
+    # 市价单的报价方式，深市最优五档即时成交剩余撤销，沪市对手方最优价格
+    price_type = xtconstant.LATEST_PRICE
+
+    if get_code_exchange(code) == 'SZ':
+        price_type = xtconstant.MARKET_SZ_CONVERT_5_CANCEL
+        price = -1
+    if get_code_exchange(code) == 'SH':
+        price_type = xtconstant.MARKET_PEER_PRICE_FIRST
+        price = price
+    return price_type, price
+
 
 def is_position_holding(position: XtPosition) -> bool:
     return position.volume > 0
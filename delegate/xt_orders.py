@@ -0,0 +1,150 @@
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from xtquant.xttype import XtOrderResponse, XtOrderError
+
+
+default_registry_capacity = 4096    # 最多保留多少笔异步委托记录
+default_latency_window = 1000       # 统计最近多少笔委托的回报延迟
+
+
+class XtPendingOrder:
+    """
+    一笔异步委托，future 在收到 QMT 回报（或委托失败）后完成，结果为自身
+    """
+    def __init__(self, code: str, order_type: int, volume: int, price: float, remark: str):
+        self.code = code
+        self.order_type = order_type
+        self.volume = volume
+        self.price = price
+        self.remark = remark
+
+        self.seq: Optional[int] = None
+        self.order_id: Optional[int] = None
+        self.error: Optional[str] = None
+        self.submitted_at = time.monotonic()
+        self.acked_at: Optional[float] = None
+        self.future: Future = Future()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.order_id is not None and self.order_id > 0
+
+    @property
+    def latency(self) -> Optional[float]:
+        # 从发出委托到收到回报的毫秒数
+        if self.acked_at is None:
+            return None
+        return (self.acked_at - self.submitted_at) * 1000
+
+    def __repr__(self) -> str:
+        return f'XtPendingOrder({self.code} seq:{self.seq} id:{self.order_id} error:{self.error} latency:{self.latency})'
+
+
+class XtOrderRegistry:
+    """
+    按 seq / order_id 索引的异步委托登记表
+    on_order_stock_async_response 回报时完成对应的 future，on_order_error 把失败原因写回同一笔委托
+    on_acknowledge 在每笔委托拿到回报后调用一次，回报比登记先到时在 register 里调用
+    """
+    def __init__(
+        self,
+        capacity: int = default_registry_capacity,
+        latency_window: int = default_latency_window,
+        on_acknowledge: Callable[[XtPendingOrder], None] = None,
+    ):
+        self.capacity = capacity
+        self.on_acknowledge = on_acknowledge
+        self.lock = threading.Lock()
+        self.by_seq: OrderedDict[int, XtPendingOrder] = OrderedDict()
+        self.by_order_id: Dict[int, XtPendingOrder] = {}
+        self.early_responses: Dict[int, XtOrderResponse] = {}   # 回报比登记先到的情况
+        self.latencies = deque(maxlen=latency_window)
+
+    def register(self, pending: XtPendingOrder, seq: int) -> None:
+        with self.lock:
+            pending.seq = seq
+            self.by_seq[seq] = pending
+            while len(self.by_seq) > self.capacity:
+                _, old = self.by_seq.popitem(last=False)
+                self.by_order_id.pop(old.order_id, None)
+
+            res = self.early_responses.pop(seq, None)
+            if res is not None:
+                self._acknowledge(pending, res)
+        if res is not None:
+            self._notify(pending)
+
+    def _acknowledge(self, pending: XtPendingOrder, res: XtOrderResponse) -> None:
+        # 调用方已持有 self.lock
+        pending.acked_at = time.monotonic()
+        pending.order_id = res.order_id
+        if res.order_id is not None and res.order_id > 0:
+            self.by_order_id[res.order_id] = pending
+        else:
+            pending.error = res.error_msg
+        self.latencies.append(pending.latency)
+        if not pending.future.done():
+            pending.future.set_result(pending)
+
+    def _notify(self, pending: XtPendingOrder) -> None:
+        # 在锁外调用，回调里可以再查登记表
+        if self.on_acknowledge is not None:
+            self.on_acknowledge(pending)
+
+    def on_response(self, res: XtOrderResponse) -> None:
+        with self.lock:
+            pending = self.by_seq.get(res.seq)
+            if pending is None:
+                self.early_responses[res.seq] = res
+                return
+            self._acknowledge(pending, res)
+        self._notify(pending)
+
+    def on_error(self, err: XtOrderError) -> None:
+        with self.lock:
+            pending = self.by_order_id.get(err.order_id)
+            if pending is None:
+                pending = self.by_seq.get(getattr(err, 'seq', None))
+            if pending is None:
+                return
+            pending.error = err.error_msg
+            if pending.acked_at is None:
+                pending.acked_at = time.monotonic()
+                self.latencies.append(pending.latency)
+            if not pending.future.done():
+                pending.future.set_result(pending)
+
+    def get_by_seq(self, seq: int) -> Optional[XtPendingOrder]:
+        with self.lock:
+            return self.by_seq.get(seq)
+
+    def get_by_order_id(self, order_id: int) -> Optional[XtPendingOrder]:
+        with self.lock:
+            return self.by_order_id.get(order_id)
+
+    def get_latency_stats(self) -> Dict[str, float]:
+        # 最近若干笔委托的回报延迟，单位毫秒
+        with self.lock:
+            values = np.array(self.latencies, dtype=np.float64)
+        if len(values) == 0:
+            return {'count': 0}
+        return {
+            'count': len(values),
+            'mean': float(values.mean()),
+            'p50': float(np.percentile(values, 50)),
+            'p95': float(np.percentile(values, 95)),
+            'max': float(values.max()),
+        }
+
+
+def wait_orders(pendings: List[Optional[XtPendingOrder]], timeout: float = None) -> List[XtPendingOrder]:
+    # 等待一篮子异步委托的回报，超时未回报的仍然返回，acked_at 为 None
+    pendings = [pending for pending in pendings if pending is not None]
+    wait([pending.future for pending in pendings], timeout=timeout)
+    return pendings
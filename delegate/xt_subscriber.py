@@ -1,21 +1,28 @@
-import json
 import datetime
 import schedule
 import threading
 import math
 import os
+import logging
 import pandas as pd
 
 from random import random
-from typing import Dict, Callable
+from typing import Dict, Callable, Mapping, Union
 
 from xtquant import xtdata
 
 from delegate.xt_delegate import XtDelegate
-from reader.reader_market import get_ak_market
+from reader.reader_market import prefetch_ak_markets
+from reader.reader_history import HistoryStore, LazyHistory
 from tools.utils_cache import check_today_is_open_day, get_total_asset_increase, load_pickle, save_pickle,\
-    load_json, save_json
+    get_state_store, FileLock
 from tools.utils_ding import DingMessager
+from tools.utils_quotes import ColumnarQuotes
+from tools.utils_panel import HistoryPanel, get_panel_path, panel_covers, panel_exists, write_panel
+from tools.utils_ticks import TickRecorder, TickArchive
+
+
+panel_lock_timeout = 1800   # 等待别的进程写完面板的最长秒数
 
 
 class XtSubscriber:
@@ -30,6 +37,8 @@ class XtSubscriber:
         execute_interval: int = 1,      # 策略执行间隔，单位（秒）
         ding_messager: DingMessager = None,
         open_tick: bool = False,
+        open_columnar_quotes: bool = False,     # 是否用预分配的列式缓存存放实时行情
+        open_async_strategy: bool = False,      # 是否在独立线程执行策略，行情回调不等待策略
         open_today_deal_report: bool = False,
         open_today_hold_report: bool = False,
     ):
@@ -46,17 +55,31 @@ class XtSubscriber:
 
         self.lock_quotes_update = threading.Lock()  # 聚合实时打点缓存的锁
 
-        self.cache_quotes: Dict[str, Dict] = {}     # 记录实时的价格信息
+        self.cache_quotes: Union[Dict[str, Dict], ColumnarQuotes] = \
+            ColumnarQuotes() if open_columnar_quotes else {}    # 记录实时的价格信息
         self.cache_limits: Dict[str, str] = {       # 限制执行次数的缓存集合
             'prev_seconds': '',                     # 限制每秒一次跑策略扫描的缓存
             'prev_minutes': '',                     # 限制每分钟屏幕心跳换行的缓存
         }
-        self.cache_history: Dict[str, pd.DataFrame] = {}     # 记录历史日线行情的信息 { code: DataFrame }
+        self.cache_history: Mapping[str, pd.DataFrame] = {}  # 记录历史日线行情的信息 { code: DataFrame }
+
+        # 异步策略的双缓冲：回调线程只写 cache_quotes（后台），策略线程只读 front_quotes（前台）
+        self.open_async_strategy = open_async_strategy
+        self.front_quotes: Union[Dict[str, Dict], ColumnarQuotes] = \
+            ColumnarQuotes() if open_columnar_quotes else {}
+        self.strategy_pending = None    # 最新一次待执行的策略触发，策略忙时旧的触发直接被覆盖
+        self.strategy_running = None    # 策略线程正在执行的触发
+        self.strategy_busy = False      # 仅回调线程置 True，仅策略线程置 False
+        self.strategy_result = None     # 策略线程写入上一轮的返回值，由回调线程处理后置回 None
+        self.strategy_event = threading.Event()
+        if open_async_strategy:
+            threading.Thread(target=self.strategy_worker, daemon=True).start()
 
         self.open_tick = open_tick
         self.quick_ticks: bool = False              # 是否开启quick tick模式
-        self.today_ticks: Dict[str, list] = {}      # 记录tick的历史信息
-        # [ 成交时间, 成交价格, 累计成交量 ]
+        self.today_ticks = TickRecorder()           # 记录tick的历史信息
+        self.path_ticks = './_cache/debug/tick_history'     # tick 历史按日归档的目录
+        # [ 成交时间, 成交价格, 累计成交量 ]，环形缓冲只存原始数值，导出时再格式化
 
         self.open_today_deal_report = open_today_deal_report
         self.open_today_hold_report = open_today_hold_report
@@ -78,6 +101,10 @@ class XtSubscriber:
             print(f'\n[{curr_time}]', end='')
 
         curr_seconds = now.strftime('%S')
+        if self.open_async_strategy:
+            self.callback_async(quotes, curr_date, curr_time, curr_seconds)
+            return
+
         with self.lock_quotes_update:
             self.cache_quotes.update(quotes)  # 合并最新数据
 
@@ -102,6 +129,71 @@ class XtSubscriber:
                             self.record_tick_to_memory(self.cache_quotes)  # 更快
                         self.cache_quotes.clear()  # execute_strategy() return True means need clear
 
+    # ================
+    # 异步策略执行
+    # ================
+    def callback_async(self, quotes: Dict, curr_date: str, curr_time: str, curr_seconds: str) -> None:
+        # 上一轮策略结束后由回调线程处理快照，后台缓冲始终只有一个写者，无需加锁
+        if not self.strategy_busy and self.strategy_result is not None:
+            if self.strategy_result:
+                if self.quick_ticks:
+                    self.record_tick_to_memory(self.front_quotes)  # 更快
+            else:
+                # 策略没要求清空，快照里的数据补回后台，后台已有的更新数据优先
+                if isinstance(self.cache_quotes, ColumnarQuotes):
+                    self.cache_quotes.update_missing(self.front_quotes)
+                else:
+                    for code, quote in self.front_quotes.items():
+                        self.cache_quotes.setdefault(code, quote)
+            self.strategy_result = None
+
+        self.cache_quotes.update(quotes)  # 合并最新数据
+
+        if self.open_tick and (not self.quick_ticks):
+            self.record_tick_to_memory(quotes)  # 更全
+
+        if self.cache_limits['prev_seconds'] != curr_seconds:
+            self.cache_limits['prev_seconds'] = curr_seconds
+
+            if int(curr_seconds) % self.execute_interval == 0:
+                print('.' if len(self.cache_quotes) > 0 else 'x', end='')  # 每秒钟开始的时候输出一个点
+                self.strategy_pending = (curr_date, curr_time, curr_seconds)
+
+        # 策略忙时不排队，等空闲后只执行最新的一次触发
+        if self.strategy_pending is not None and not self.strategy_busy:
+            self.publish_snapshot()
+
+    def publish_snapshot(self) -> None:
+        # 后台缓冲整个交给策略线程作为快照，后台换成清空的旧前台缓冲继续接收推送
+        self.front_quotes, self.cache_quotes = self.cache_quotes, self.front_quotes
+        self.cache_quotes.clear()
+
+        self.strategy_running = self.strategy_pending
+        self.strategy_pending = None
+        self.strategy_busy = True
+        self.strategy_event.set()
+
+    def strategy_worker(self) -> None:
+        while True:
+            self.strategy_event.wait()
+            self.strategy_event.clear()
+
+            curr_date, curr_time, curr_seconds = self.strategy_running
+            result = False
+            try:
+                # execute_strategy() return True means need clear
+                result = bool(self.execute_strategy(
+                    curr_date,
+                    curr_time,
+                    curr_seconds,
+                    self.front_quotes,
+                ))
+            except Exception as e:
+                logging.error(f'策略执行异常 {curr_time}:{curr_seconds} {e}')
+            finally:
+                self.strategy_result = result   # 先写结果再置空闲，回调线程看到空闲时结果一定已写入
+                self.strategy_busy = False
+
     # ================
     # 订阅tick相关
     # ================
@@ -135,25 +227,22 @@ class XtSubscriber:
     # ================
     def record_tick_to_memory(self, quotes):
         # 记录 tick 历史
-        for code in quotes:
-            if code not in self.today_ticks:
-                self.today_ticks[code] = []
-
-            tick_time = datetime.datetime.fromtimestamp(quotes[code]['time'] / 1000).strftime('%H:%M:%S')
-            self.today_ticks[code].append([
-                tick_time,                              # 成交时间，格式：%H:%M:%S
-                round(quotes[code]['lastPrice'], 2),    # 成交价格
-                quotes[code]['volume'],                 # 累计成交量（手）
-            ])
+        self.today_ticks.record(quotes)
 
     def clean_ticks_history(self):
         self.today_ticks.clear()
 
+    def flush_tick_history(self):
+        # 盘中定时增量落盘，没有新 tick 时不写文件
+        curr_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        TickArchive(self.path_ticks, curr_date).flush(self.today_ticks)
+
     def save_tick_history(self):
-        json_file = './_cache/debug/tick_history.json'
-        with open(json_file, 'w') as file:
-            json.dump(self.today_ticks, file, indent=4)
-        print(f"字典已成功存储为 {json_file} 文件")
+        curr_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        archive = TickArchive(self.path_ticks, curr_date)
+        archive.flush(self.today_ticks)
+        count = archive.consolidate()
+        print(f'{count} 条 tick 已成功存储到 {archive.path} 目录')
 
     # ================
     # 盘前下载数据缓存
@@ -162,17 +251,11 @@ class XtSubscriber:
         print(f'Prepared time range: {start} - {end}')
         t0 = datetime.datetime.now()
 
-        group_size = 200
-        for i in range(0, len(target_codes), group_size):
-            sub_codes = [sub_code for sub_code in target_codes[i:i + group_size]]
-
-            for code in sub_codes:
-                df = get_ak_market(code, start, end, columns=columns, adjust=adjust)
-
-                if df is not None:
-                    self.cache_history[code] = df
-
-            print(i, sub_codes)  # 已更新数量
+        # 线程池并发 + 令牌桶限速，单只失败按退避重试
+        histories = prefetch_ak_markets(target_codes, start, end, columns=columns, adjust=adjust)
+        for code in target_codes:
+            if code in histories:
+                self.cache_history[code] = histories[code]
 
         t1 = datetime.datetime.now()
         print(f'Prepared TIME COST: {t1 - t0}')
@@ -199,6 +282,84 @@ class XtSubscriber:
             save_pickle(cache_path, self.cache_history)
             print(f'{len(self.cache_history)} of {len(code_list)} histories saved to {cache_path}')
 
+    def download_store_history(
+        self,
+        store_path: str,
+        code_list: list[str],
+        start: str,
+        end: str,
+        adjust: str,
+        columns: list[str],
+    ):
+        # 本地追加写的日线存储，每天只补缺的K线，策略按需懒加载
+        t0 = datetime.datetime.now()
+        store = HistoryStore(store_path, adjust)
+        appended = store.update(code_list, start, end)
+        self.cache_history = store.view(code_list, start, end, columns)
+        t1 = datetime.datetime.now()
+        print(f'{len(self.cache_history)} of {len(code_list)} histories ready in {store_path}, '
+              f'{sum(appended.values())} bars appended, TIME COST: {t1 - t0}')
+
+    def download_panel_history(
+        self,
+        panel_path: str,
+        store_path: str,
+        code_list: list[str],
+        start: str,
+        end: str,
+        adjust: str,
+        columns: list[str],
+    ):
+        # 每个交易日只写一次共享面板，覆盖日线存储里所有策略用过的股票，其他策略进程直接 mmap 挂载
+        t0 = datetime.datetime.now()
+        path = get_panel_path(panel_path, end, adjust)
+        store = HistoryStore(store_path, adjust)
+        if not panel_exists(path):
+            os.makedirs(panel_path, exist_ok=True)
+            # 持锁后再检查一次，多个进程同时启动时只有一个去下载和写盘
+            with FileLock(path, timeout=panel_lock_timeout, stale=panel_lock_timeout):
+                if not panel_exists(path):
+                    universe = list(dict.fromkeys(store.list_codes() + list(code_list)))
+                    store.update(universe, start, end)
+                    write_panel(path, store.view(universe, start, end), universe, start)
+        self.attach_panel_history(path, store, code_list, start, end, columns)
+        t1 = datetime.datetime.now()
+        print(f'{len(code_list)} histories attached from {path}, TIME COST: {t1 - t0}')
+
+    def attach_lazy_history(
+        self,
+        panel_path: str,
+        store_path: str,
+        code_list: list[str],
+        start: str,
+        end: str,
+        adjust: str,
+        columns: list[str],
+    ):
+        # 盘中重启用，不预先加载，卖出策略用到哪只再读哪只
+        path = get_panel_path(panel_path, end, adjust)
+        panel = HistoryPanel(path, columns, start) if panel_covers(path, start) else None
+        self.cache_history = LazyHistory(HistoryStore(store_path, adjust), code_list, start, end, columns, panel)
+        print(f'{len(code_list)} histories attached lazily, panel: {panel is not None}')
+
+    def attach_panel_history(
+        self,
+        path: str,
+        store: HistoryStore,
+        code_list: list[str],
+        start: str,
+        end: str,
+        columns: list[str],
+    ):
+        # 面板覆盖全部股票时直接用面板，面板起始日期太晚或缺股票时缺的部分从日线存储按需读
+        panel = HistoryPanel(path, columns, start) if panel_covers(path, start) else None
+        missing = [code for code in code_list if panel is None or code not in panel]
+        if len(missing) == 0:
+            self.cache_history = panel
+            return
+        store.update(missing, start, end)
+        self.cache_history = LazyHistory(store, code_list, start, end, columns, panel)
+
     # ================
     # 盘后报告总结
     # ================
@@ -266,6 +427,7 @@ class XtSubscriber:
 
         if self.open_tick:
             schedule.every().day.at('09:10').do(self.clean_ticks_history)
+            schedule.every(10).minutes.do(self.flush_tick_history)
             schedule.every().day.at('15:30').do(self.save_tick_history)
 
         schedule.every().day.at('09:15').do(self.subscribe_tick)
@@ -297,25 +459,24 @@ def update_position_held(lock: threading.Lock, delegate: XtDelegate, path: str):
     with lock:
         positions = delegate.check_positions()
 
-        held_days = load_json(path)
-
-        # 添加未被缓存记录的持仓
-        for position in positions:
-            if position.can_use_volume > 0 and \
-                    position.stock_code not in held_days.keys():
-                held_days[position.stock_code] = 0
+        def update(held_days: dict) -> None:
+            # 添加未被缓存记录的持仓
+            for position in positions:
+                if position.can_use_volume > 0 and \
+                        position.stock_code not in held_days.keys():
+                    held_days[position.stock_code] = 0
 
-        # 删除已清仓的held_days记录
-        position_codes = [position.stock_code for position in positions]
-        holding_codes = list(held_days.keys())
-        for code in holding_codes:
-            if code[0] == '_':
-                continue
+            # 删除已清仓的held_days记录
+            position_codes = [position.stock_code for position in positions]
+            holding_codes = list(held_days.keys())
+            for code in holding_codes:
+                if code[0] == '_':
+                    continue
 
-            if code not in position_codes:
-                del held_days[code]
+                if code not in position_codes:
+                    del held_days[code]
 
-        save_json(path, held_days)
+        get_state_store(path).transact(update)
 
 
 # ================================
@@ -19,6 +19,11 @@
 import numpy as np
 import pandas as pd
 
+try:  # 装了numba时循环类函数用JIT编译, 没装时退回纯Python循环, 结果一致
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 # ------------------ 0级：核心工具函数 --------------------------------------------
 def RD(N, D=3):   return np.round(N, D)  # 四舍五入取3位小数
@@ -68,6 +73,18 @@ def CONST(S):  # 返回序列S最后的值组成常量序列
     return np.full(len(S), S[-1])
 
 
+def _ROLLING_WINDOWS(S, N):  # 沿最后一维取N周期滑动窗口, 支持一维序列和二维(股票x时间)面板
+    S = np.asarray(S, dtype=float)
+    if S.shape[-1] < N: return S, None
+    return S, np.lib.stride_tricks.sliding_window_view(S, N, axis=-1)
+
+
+def _PAD_LEFT(S, V, N):  # 窗口结果左侧补N-1个nan, 与rolling输出对齐
+    out = np.full(S.shape, np.nan)
+    if V is not None: out[..., N - 1:] = V
+    return out
+
+
 # def HHV(S,N):             #HHV(C, 5) 最近5天收盘最高价
 #     return pd.Series(S).rolling(N).max().values
 #
@@ -76,11 +93,15 @@ def CONST(S):  # 返回序列S最后的值组成常量序列
 
 
 def HHVBARS(S, N):  # 求N周期内S最高值到当前周期数, 返回序列
-    return pd.Series(S).rolling(N).apply(lambda x: np.argmax(x[::-1]), raw=True).values
+    S, W = _ROLLING_WINDOWS(S, N)
+    if W is None: return _PAD_LEFT(S, None, N)
+    return _PAD_LEFT(S, np.where(np.isnan(W).any(axis=-1), np.nan, np.argmax(W[..., ::-1], axis=-1)), N)
 
 
 def LLVBARS(S, N):  # 求N周期内S最低值到当前周期数, 返回序列
-    return pd.Series(S).rolling(N).apply(lambda x: np.argmin(x[::-1]), raw=True).values
+    S, W = _ROLLING_WINDOWS(S, N)
+    if W is None: return _PAD_LEFT(S, None, N)
+    return _PAD_LEFT(S, np.where(np.isnan(W).any(axis=-1), np.nan, np.argmin(W[..., ::-1], axis=-1)), N)
 
 
 def MA(S, N):  # 求序列的N日简单移动平均值，返回序列
@@ -96,29 +117,45 @@ def SMA(S, N, M=1):  # 中国式的SMA,至少需要120周期才精确 (雪球180
 
 
 def WMA(S, N):  # 通达信S序列的N日加权移动平均 Yn = (1*X1+2*X2+3*X3+...+n*Xn)/(1+2+3+...+Xn)
-    return pd.Series(S).rolling(N).apply(lambda x: x[::-1].cumsum().sum() * 2 / N / (N + 1), raw=True).values
+    S, W = _ROLLING_WINDOWS(S, N)
+    return _PAD_LEFT(S, None if W is None else W @ np.arange(1, N + 1) * 2 / N / (N + 1), N)
 
 
-def DMA(S, A):  # 求S的动态移动平均，A作平滑因子,必须 0<A<1  (此为核心函数，非指标）
-    if isinstance(A, (int, float)):  return pd.Series(S).ewm(alpha=A, adjust=False).mean().values
-    A = np.array(A);
-    A[np.isnan(A)] = 1.0;
-    Y = np.zeros(len(S));
+def _DMA_LOOP(S, A):  # 序列平滑因子的递推, 无法向量化, 有numba时编译
+    Y = np.zeros(len(S))
     Y[0] = S[0]
-    for i in range(1, len(S)): Y[i] = A[i] * S[i] + (1 - A[i]) * Y[i - 1]  # A支持序列 by jqz1226
+    for i in range(1, len(S)): Y[i] = A[i] * S[i] + (1 - A[i]) * Y[i - 1]
     return Y
 
 
+def DMA(S, A):  # 求S的动态移动平均，A作平滑因子,必须 0<A<1  (此为核心函数，非指标）
+    if isinstance(A, (int, float)):  return pd.Series(S).ewm(alpha=A, adjust=False).mean().values
+    A = np.array(A, dtype=float);
+    A[np.isnan(A)] = 1.0;  # A支持序列 by jqz1226
+    if njit is None: return _DMA_LOOP(np.asarray(S, dtype=float).tolist(), A.tolist())
+    return _DMA_LOOP(np.asarray(S, dtype=float), A)
+
+
 def AVEDEV(S, N):  # 平均绝对偏差  (序列与其平均值的绝对差的平均值)
-    return pd.Series(S).rolling(N).apply(lambda x: (np.abs(x - x.mean())).mean()).values
+    S, W = _ROLLING_WINDOWS(S, N)
+    return _PAD_LEFT(S, None if W is None else np.abs(W - W.mean(axis=-1, keepdims=True)).mean(axis=-1), N)
+
+
+def _LINREG(S, N):  # N周期线性回归的斜率和窗口均值, 闭式解 slope=Σ(x-x̄)y/Σ(x-x̄)²
+    S, W = _ROLLING_WINDOWS(S, N)
+    if W is None: return S, None, None
+    X = np.arange(N) - (N - 1) / 2
+    return S, W @ X / (X @ X), W.mean(axis=-1)
 
 
-def SLOPE(S, N):  # 返S序列N周期回线性回归斜率
-    return pd.Series(S).rolling(N).apply(lambda x: np.polyfit(range(N), x, deg=1)[0], raw=True).values
+def SLOPE(S, N):  # 返S序列N周期回线性回归斜率, S可为二维(股票x时间)
+    S, K, _ = _LINREG(S, N)
+    return _PAD_LEFT(S, K, N)
 
 
-def FORCAST(S, N):  # 返回S序列N周期回线性回归后的预测值， jqz1226改进成序列出
-    return pd.Series(S).rolling(N).apply(lambda x: np.polyval(np.polyfit(range(N), x, deg=1), N - 1), raw=True).values
+def FORCAST(S, N):  # 返回S序列N周期回线性回归后的预测值， jqz1226改进成序列出, S可为二维(股票x时间)
+    S, K, M = _LINREG(S, N)
+    return _PAD_LEFT(S, None if K is None else M + K * (N - 1) / 2, N)
 
 
 def LAST(S, A, B):  # 从前A日到前B日一直满足S_BOOL条件, 要求A>B & A>0 & B>=0
@@ -139,25 +176,31 @@ def EXIST(S, N):  # EXIST(CLOSE>3010, N=5)  n日内是否存在一天大于3000
 
 
 def FILTER(S, N):  # FILTER函数，S满足条件后，将其后N周期内的数据置为0, FILTER(C==H,5)
-    for i in range(len(S)): S[i + 1:i + 1 + N] = 0 if S[i] else S[i + 1:i + 1 + N]
+    A, nxt = np.asarray(S), 0  # 只遍历成立的位置, 被置0区间内的跳过
+    for i in np.flatnonzero(A):
+        if i >= nxt: A[i + 1:i + 1 + N] = 0; nxt = i + 1 + N
     return S  # 例：FILTER(C==H,5) 涨停后，后5天不再发出信号
 
 
 def BARSLAST(S):  # 上一次条件成立到当前的周期, BARSLAST(C/REF(C,1)>=1.1) 上一次涨停到今天的天数
-    M = np.concatenate(([0], np.where(S, 1, 0)))
-    for i in range(1, len(M)):  M[i] = 0 if M[i] else M[i - 1] + 1
-    return M[1:]
+    I = np.arange(1, len(S) + 1)
+    return I - np.maximum.accumulate(np.where(S, I, 0))
 
 
 def BARSLASTCOUNT(S):  # 统计连续满足S条件的周期数        by jqz1226
-    rt = np.zeros(len(S) + 1)  # BARSLASTCOUNT(CLOSE>OPEN)表示统计连续收阳的周期数
-    for i in range(len(S)): rt[i + 1] = rt[i] + 1 if S[i] else rt[i + 1]
-    return rt[1:]
+    I = np.arange(1, len(S) + 1)  # BARSLASTCOUNT(CLOSE>OPEN)表示统计连续收阳的周期数
+    return (I - np.maximum.accumulate(np.where(S, 0, I))).astype(float)
 
 
 def BARSSINCEN(S, N):  # N周期内第一次S条件成立到现在的周期数,N为常量  by jqz1226
-    return pd.Series(S).rolling(N).apply(lambda x: N - 1 - np.argmax(x) if np.argmax(x) or x[0] else 0,
-                                         raw=True).fillna(0).values.astype(int)
+    S, W = _ROLLING_WINDOWS(S, N)
+    if W is None: return np.zeros(S.shape, dtype=int)
+    I = np.argmax(W, axis=-1)
+    V = np.where((I > 0) | (W[..., 0] != 0), N - 1 - I, 0)
+    V[np.isnan(W).any(axis=-1)] = 0
+    out = np.zeros(S.shape, dtype=int)
+    out[..., N - 1:] = V
+    return out
 
 
 def CROSS(S1, S2):                     # 判断向上金叉穿越 CROSS(MA(C,5),MA(C,10))  判断向下死叉穿越 CROSS(MA(C,10),MA(C,5))
@@ -175,16 +218,34 @@ def BETWEEN(S, A, B):  # S处于A和B之间时为真。 包括 A<S<B 或 A>S>B
     return ((A < S) & (S < B)) | ((A > S) & (S > B))
 
 
+def _RANGE_LOOP(S):  # 单调栈: 往前数连续小于当前值的周期数, 全部小于时按原实现返回0
+    rt = np.zeros(len(S), dtype=np.int64)
+    stack = np.zeros(len(S), dtype=np.int64)
+    top = 0
+    for i in range(len(S)):
+        while top > 0 and S[stack[top - 1]] < S[i]: top -= 1
+        if top > 0: rt[i] = i - 1 - stack[top - 1]
+        stack[top] = i
+        top += 1
+    return rt
+
+
+def _RANGE(S):
+    S = np.asarray(S, dtype=float)
+    return _RANGE_LOOP(S.tolist() if njit is None else S).astype('int')
+
+
 def TOPRANGE(S):  # TOPRANGE(HIGH)表示当前最高价是近多少周期内最高价的最大值 by jqz1226
-    rt = np.zeros(len(S))
-    for i in range(1, len(S)):  rt[i] = np.argmin(np.flipud(S[:i] < S[i]))
-    return rt.astype('int')
+    return _RANGE(S)
 
 
 def LOWRANGE(S):  # LOWRANGE(LOW)表示当前最低价是近多少周期内最低价的最小值 by jqz1226
-    rt = np.zeros(len(S))
-    for i in range(1, len(S)):  rt[i] = np.argmin(np.flipud(S[:i] > S[i]))
-    return rt.astype('int')
+    return _RANGE(-np.asarray(S, dtype=float))
+
+
+if njit is not None:
+    _DMA_LOOP = njit(cache=True)(_DMA_LOOP)
+    _RANGE_LOOP = njit(cache=True)(_RANGE_LOOP)
 
 
 # ------------------   2级：技术指标函数(全部通过0级，1级函数实现） ------------------------------
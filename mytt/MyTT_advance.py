@@ -10,6 +10,32 @@ from mytt.MyTT import *
 
 # ------------------------工具函数---------------------------------------------
 
+def _RANGE_QUERY(S, N, F):  # N为序列时, 用稀疏表O(1)查询区间[i+1-N[i], i]的最值, 建表O(nlogn)
+    # type: (np.ndarray, np.ndarray, np.ufunc) -> np.ndarray
+    N = np.asarray(N, dtype=float)
+    I = np.arange(len(S))
+    res = np.repeat(np.nan, len(S))
+    valid = ~np.isnan(N) & (N > 0) & (N <= I + 1)
+    if not valid.any():
+        return res
+
+    R = I[valid]
+    L = R + 1 - N[valid].astype(int)
+    K = np.log2(R - L + 1).astype(int)  # 区间长度向下取2的幂
+
+    table = [np.asarray(S, dtype=float)]
+    for k in range(1, int(K.max()) + 1):
+        prev, half = table[-1], 1 << (k - 1)
+        table.append(F(prev[:-half], prev[half:]))  # table[k][i] 为 S[i:i+2^k] 的最值
+
+    out = np.empty(len(R))
+    for k in np.unique(K):
+        m = K == k
+        out[m] = F(table[k][L[m]], table[k][R[m] - (1 << k) + 1])
+    res[valid] = out
+    return res
+
+
 def HHV(S, N):  # HHV,支持N为序列版本
     # type: (np.ndarray, Optional[int,float, np.ndarray]) -> np.ndarray
     """
@@ -18,11 +44,7 @@ def HHV(S, N):  # HHV,支持N为序列版本
     if isinstance(N, (int, float)):
         return pd.Series(S).rolling(N).max().values
     else:
-        res = np.repeat(np.nan, len(S))
-        for i in range(len(S)):
-            if (not np.isnan(N[i])) and 0 < N[i] <= i + 1:
-                res[i] = S[i + 1 - N[i]:i + 1].max()
-        return res
+        return _RANGE_QUERY(S, N, np.fmax if isinstance(S, pd.Series) else np.maximum)  # Series切片max会跳过nan
 
 
 def LLV(S, N):  # LLV,支持N为序列版本
@@ -33,11 +55,7 @@ def LLV(S, N):  # LLV,支持N为序列版本
     if isinstance(N, (int, float)):
         return pd.Series(S).rolling(N).min().values
     else:
-        res = np.repeat(np.nan, len(S))
-        for i in range(len(S)):
-            if (not np.isnan(N[i])) and 0 < N[i] <= i + 1:
-                res[i] = S[i + 1 - N[i]:i + 1].min()
-        return res
+        return _RANGE_QUERY(S, N, np.fmin if isinstance(S, pd.Series) else np.minimum)
 
 
 def DSMA(X, N):  # 偏差自适应移动平均线   type: (np.ndarray, int) -> np.ndarray
@@ -38,33 +38,39 @@ def CROSS_PLUS(S1, S2):
     return (S1 > S2) & (S1.shift(1) < S2)
 
 
-def COUNT_PLUS(S, N):
+def COUNT_PLUS(S, N):  # N为序列的COUNT, 前缀和相减得到每个区间的计数
+    S = np.asarray(S)
+    N = np.asarray(N, dtype=float)
+    I = np.arange(len(S))
     res = np.repeat(np.nan, len(S))
-    for i in range(len(S)):
-        if (not np.isnan(N[i])):
-            if 0 < N[i] <= i + 1:
-                res[i] = np.sum(S[max(0, i + 1 - N[i]):i + 1])
-            if N[i] == 0:
-                res[i] = 0
+    if len(S) == 0:
+        return res.astype(int)
+
+    NA = np.isnan(S) if S.dtype.kind == 'f' else np.zeros(len(S), dtype=bool)
+    P = np.concatenate(([0], np.cumsum(np.where(NA, 0, S))))
+    C = np.concatenate(([0], np.cumsum(NA)))  # 区间内含nan时和原实现一样为nan
+
+    valid = ~np.isnan(N) & (N > 0) & (N <= I + 1)
+    R = I[valid] + 1
+    L = R - N[valid].astype(int)
+    res[valid] = np.where(C[R] - C[L] > 0, np.nan, P[R] - P[L])
+    res[N == 0] = 0
     return res.astype(int)
 
 
-def REF_PLUS(S, N):
+def REF_PLUS(S, N):  # N为序列的REF, N不合法时沿用上一个结果, 超出N长度的部分为nan
+    S = np.asarray(S)
     result = np.repeat(np.nan, len(S))
 
-    nCount = len(N)
-    for i in range(len(S)):
-        if i >= nCount:
-            continue
+    count = min(len(S), len(N))
+    if count == 0:
+        return result
 
-        value = N[i]
-
-        value = int(value)
-        if value >= 0 and value <= i:
-            result[i] = S[i - value]
-        elif i:
-            result[i] = result[i - 1]
-        else:
-            result[i] = S[i]
+    I = np.arange(count)
+    V = np.trunc(np.asarray(N[:count], dtype=float)).astype(int)
+    valid = (V >= 0) & (V <= I)
+    valid[0], V[0] = True, 0  # 第0个无论N为何值都取S[0]
 
+    last = np.maximum.accumulate(np.where(valid, I, 0))  # 向前找最近一个合法位置
+    result[:count] = S[last - V[last]]
     return result
@@ -0,0 +1,260 @@
+# MyTT 面板版本：输入为二维数组 (股票 x 时间)，一次算出所有股票的指标
+# 也可直接传入 HistoryPanel.field('close') 这类 mmap 面板，一维序列同样适用
+# 滚动和指数平均直接用 NumPy 沿时间轴(最后一维)计算，nan 处理与 pandas 的 rolling/ewm 一致
+# 注意：面板里停牌/未上市的交易日为 nan，和逐只股票去掉缺失日再算的结果会有差别
+
+import numpy as np
+import pandas as pd
+
+from mytt.MyTT import RD, ABS, MAX, MIN, IF
+from mytt.MyTT import WMA, SLOPE, FORCAST, HHVBARS, LLVBARS, BARSSINCEN  # 这些已沿最后一维计算, 直接复用
+
+
+# ------------------ 0级：核心工具函数 --------------------------------------------
+def _APPLY(S, F):  # (股票x时间) 转置后交给pandas按列计算, 再转回原形状
+    S = np.asarray(S, dtype=float)
+    return F(pd.DataFrame(S.T)).values.T.reshape(S.shape)
+
+
+def _WINDOWS(S, N):  # 沿最后一维的N周期滑动窗口, 不足N周期返回None
+    S = np.asarray(S, dtype=float)
+    if N <= 0 or S.shape[-1] < N: return S, None
+    return S, np.lib.stride_tricks.sliding_window_view(S, N, axis=-1)
+
+
+def _PAD(S, V, N):  # 窗口结果左侧补N-1个nan, 与rolling输出对齐
+    out = np.full(S.shape, np.nan)
+    if V is not None: out[..., N - 1:] = V
+    return out
+
+
+def _EWM(S, com):  # 等价 pandas ewm(com, adjust=False).mean(), 按时间逐列递推, 所有股票同时计算
+    S = np.asarray(S, dtype=float)
+    alpha = 1. / (1. + com)  # 与pandas一样由com换算, 保证逐位一致
+    out = np.empty(S.shape)
+    if S.shape[-1] == 0: return out
+    weighted = S[..., 0].copy()
+    old_wt = np.ones(S.shape[:-1])
+    out[..., 0] = weighted
+    for i in range(1, S.shape[-1]):
+        cur = S[..., i]
+        has_prev = ~np.isnan(weighted)
+        is_obs = ~np.isnan(cur)
+        old_wt = np.where(has_prev, old_wt * (1 - alpha), old_wt)
+        mixed = has_prev & is_obs & (weighted != cur)
+        with np.errstate(invalid='ignore'):
+            blend = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+        weighted = np.where(mixed, blend, weighted)
+        old_wt = np.where(has_prev & is_obs, 1.0, old_wt)
+        weighted = np.where(~has_prev & is_obs, cur, weighted)
+        out[..., i] = weighted
+    return out
+
+
+def REF(S, N=1):  # 对序列整体下移动N,返回序列(shift后会产生NAN)
+    return _APPLY(S, lambda df: df.shift(N))
+
+
+def DIFF(S, N=1):  # 前一个值减后一个值,前面会产生nan
+    return _APPLY(S, lambda df: df.diff(N))
+
+
+def STD(S, N):  # 求序列的N日标准差，返回序列
+    S = np.asarray(S, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        C = S - np.nanmean(S, axis=-1, keepdims=True)  # 先按股票去中心化, 减少前缀和相减的精度损失
+        M = SUM(C, N) / N
+        return np.sqrt(np.maximum(SUM(C * C, N) / N - M * M, 0))
+
+
+def SUM(S, N):  # 对序列求N天累计和，返回序列    N=0对序列所有依次求和
+    S = np.asarray(S, dtype=float)
+    NA = np.isnan(S)
+    if N <= 0: return np.where(NA, np.nan, np.cumsum(np.where(NA, 0, S), axis=-1))
+    out = np.full(S.shape, np.nan)
+    if S.shape[-1] < N: return out
+    pad = np.zeros(S.shape[:-1] + (1,))
+    CS = np.concatenate([pad, np.cumsum(np.where(NA, 0, S), axis=-1)], axis=-1)  # 前缀和相减得窗口和
+    CN = np.concatenate([pad, np.cumsum(NA, axis=-1)], axis=-1)  # 窗口内有nan则为nan
+    out[..., N - 1:] = np.where(CN[..., N:] - CN[..., :-N] > 0, np.nan, CS[..., N:] - CS[..., :-N])
+    return out
+
+
+def _SHIFTED(S, N):  # 依次给出窗口内第k个位置对齐后的切片, 每次是一整块连续内存的向量运算
+    n = S.shape[-1]
+    for k in range(N): yield S[..., k:n - N + 1 + k]
+
+
+def _REDUCE(S, N, F):  # 用N次逐元素运算代替滑动窗口归约, nan照常传播
+    S = np.asarray(S, dtype=float)
+    if N <= 0 or S.shape[-1] < N: return _PAD(S, None, N)
+    slices = _SHIFTED(S, N)
+    V = next(slices).copy()
+    for X in slices: F(V, X, out=V)
+    return _PAD(S, V, N)
+
+
+def HHV(S, N):  # HHV(C, 5) 最近5天收盘最高价
+    return _REDUCE(S, N, np.maximum)
+
+
+def LLV(S, N):  # LLV(C, 5) 最近5天收盘最低价
+    return _REDUCE(S, N, np.minimum)
+
+
+def AVEDEV(S, N):  # 平均绝对偏差  (序列与其平均值的绝对差的平均值)
+    S = np.asarray(S, dtype=float)
+    if N <= 0 or S.shape[-1] < N: return _PAD(S, None, N)
+    M = MA(S, N)[..., N - 1:]
+    V = np.zeros(M.shape)
+    for X in _SHIFTED(S, N): V += np.abs(X - M)
+    return _PAD(S, V / N, N)
+
+
+def MA(S, N):  # 求序列的N日简单移动平均值，返回序列
+    return SUM(S, N) / N
+
+
+def EMA(S, N):  # 指数移动平均,为了精度 S>4*N  EMA至少需要120周期     alpha=2/(span+1)
+    return _EWM(S, (N - 1) / 2.)
+
+
+def SMA(S, N, M=1):  # 中国式的SMA,至少需要120周期才精确 (雪球180周期)    alpha=1/(1+com)
+    return _EWM(S, (1 - M / N) / (M / N))
+
+
+def COUNT(S, N):  # COUNT(CLOSE>O, N):  最近N天满足S_BOO的天数  True的天数
+    return SUM(S, N)
+
+
+def EVERY(S, N):  # EVERY(CLOSE>O, 5)   最近N天是否都是True
+    return IF(SUM(S, N) == N, True, False)
+
+
+def EXIST(S, N):  # EXIST(CLOSE>3010, N=5)  n日内是否存在一天大于3000点
+    return IF(SUM(S, N) > 0, True, False)
+
+
+def CROSS(S1, S2):  # 判断向上金叉穿越, 沿时间轴(最后一维)比较
+    B = np.asarray(S1 > S2)
+    out = np.zeros(B.shape, dtype=bool)
+    out[..., 1:] = ~B[..., :-1] & B[..., 1:]
+    return out
+
+
+def LAST_VALUE(S):  # 每只股票最后一个交易日的值, 选股时常用
+    return np.asarray(S)[..., -1]
+
+
+# ------------------   2级：技术指标函数(全部通过0级，1级函数实现） ------------------------------
+def MACD(CLOSE, SHORT=12, LONG=26, M=9):  # EMA的关系，S取120日，和雪球小数点2位相同
+    DIF = EMA(CLOSE, SHORT) - EMA(CLOSE, LONG);
+    DEA = EMA(DIF, M);
+    MACD = (DIF - DEA) * 2
+    return RD(DIF), RD(DEA), RD(MACD)
+
+
+def KDJ(CLOSE, HIGH, LOW, N=9, M1=3, M2=3):  # KDJ指标
+    RSV = (CLOSE - LLV(LOW, N)) / (HHV(HIGH, N) - LLV(LOW, N)) * 100
+    K = EMA(RSV, (M1 * 2 - 1));
+    D = EMA(K, (M2 * 2 - 1));
+    J = K * 3 - D * 2
+    return K, D, J
+
+
+def RSI(CLOSE, N=24):  # RSI指标,和通达信小数点2位相同
+    DIF = CLOSE - REF(CLOSE, 1)
+    return RD(SMA(MAX(DIF, 0), N) / SMA(ABS(DIF), N) * 100)
+
+
+def WR(CLOSE, HIGH, LOW, N=10, N1=6):  # W&R 威廉指标
+    WR = (HHV(HIGH, N) - CLOSE) / (HHV(HIGH, N) - LLV(LOW, N)) * 100
+    WR1 = (HHV(HIGH, N1) - CLOSE) / (HHV(HIGH, N1) - LLV(LOW, N1)) * 100
+    return RD(WR), RD(WR1)
+
+
+def BIAS(CLOSE, L1=6, L2=12, L3=24):  # BIAS乖离率
+    BIAS1 = (CLOSE - MA(CLOSE, L1)) / MA(CLOSE, L1) * 100
+    BIAS2 = (CLOSE - MA(CLOSE, L2)) / MA(CLOSE, L2) * 100
+    BIAS3 = (CLOSE - MA(CLOSE, L3)) / MA(CLOSE, L3) * 100
+    return RD(BIAS1), RD(BIAS2), RD(BIAS3)
+
+
+def BOLL(CLOSE, N=20, P=2):  # BOLL指标，布林带
+    MID = MA(CLOSE, N)
+    SD = STD(CLOSE, N)
+    UPPER = MID + SD * P
+    LOWER = MID - SD * P
+    return RD(UPPER), RD(MID), RD(LOWER)
+
+
+def PSY(CLOSE, N=12, M=6):
+    PSY = COUNT(CLOSE > REF(CLOSE, 1), N) / N * 100
+    PSYMA = MA(PSY, M)
+    return RD(PSY), RD(PSYMA)
+
+
+def CCI(CLOSE, HIGH, LOW, N=14):
+    TP = (HIGH + LOW + CLOSE) / 3
+    return (TP - MA(TP, N)) / (0.015 * AVEDEV(TP, N))
+
+
+def ATR(CLOSE, HIGH, LOW, N=20):  # 真实波动N日平均值
+    TR = MAX(MAX((HIGH - LOW), ABS(REF(CLOSE, 1) - HIGH)), ABS(REF(CLOSE, 1) - LOW))
+    return MA(TR, N)
+
+
+def BBI(CLOSE, M1=3, M2=6, M3=12, M4=20):  # BBI多空指标
+    return (MA(CLOSE, M1) + MA(CLOSE, M2) + MA(CLOSE, M3) + MA(CLOSE, M4)) / 4
+
+
+def DMI(CLOSE, HIGH, LOW, M1=14, M2=6):  # 动向指标：结果和同花顺，通达信完全一致
+    TR = SUM(MAX(MAX(HIGH - LOW, ABS(HIGH - REF(CLOSE, 1))), ABS(LOW - REF(CLOSE, 1))), M1)
+    HD = HIGH - REF(HIGH, 1);
+    LD = REF(LOW, 1) - LOW
+    DMP = SUM(IF((HD > 0) & (HD > LD), HD, 0), M1)
+    DMM = SUM(IF((LD > 0) & (LD > HD), LD, 0), M1)
+    PDI = DMP * 100 / TR;
+    MDI = DMM * 100 / TR
+    ADX = MA(ABS(MDI - PDI) / (PDI + MDI) * 100, M2)
+    ADXR = (ADX + REF(ADX, M2)) / 2
+    return PDI, MDI, ADX, ADXR
+
+
+def TAQ(HIGH, LOW, N):  # 唐安奇通道(海龟)交易指标，大道至简，能穿越牛熊
+    UP = HHV(HIGH, N);
+    DOWN = LLV(LOW, N);
+    MID = (UP + DOWN) / 2
+    return UP, MID, DOWN
+
+
+def KTN(CLOSE, HIGH, LOW, N=20, M=10):  # 肯特纳交易通道, N选20日，ATR选10日
+    MID = EMA((HIGH + LOW + CLOSE) / 3, N)
+    ATRN = ATR(CLOSE, HIGH, LOW, M)
+    UPPER = MID + 2 * ATRN;
+    LOWER = MID - 2 * ATRN
+    return UPPER, MID, LOWER
+
+
+def TRIX(CLOSE, M1=12, M2=20):  # 三重指数平滑平均线
+    TR = EMA(EMA(EMA(CLOSE, M1), M1), M1)
+    TRIX = (TR - REF(TR, 1)) / REF(TR, 1) * 100
+    TRMA = MA(TRIX, M2)
+    return TRIX, TRMA
+
+
+def VR(CLOSE, VOL, M1=26):  # VR容量比率
+    LC = REF(CLOSE, 1)
+    return SUM(IF(CLOSE > LC, VOL, 0), M1) / SUM(IF(CLOSE <= LC, VOL, 0), M1) * 100
+
+
+def MTM(CLOSE, N=12, M=6):  # 动量指标
+    MTM = CLOSE - REF(CLOSE, N);
+    MTMMA = MA(MTM, M)
+    return MTM, MTMMA
+
+
+def ROC(CLOSE, N=12, M=6):  # 变动率指标
+    ROC = 100 * (CLOSE - REF(CLOSE, N)) / REF(CLOSE, N);
+    MAROC = MA(ROC, M)
+    return ROC, MAROC
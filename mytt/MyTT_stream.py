@@ -0,0 +1,301 @@
+# MyTT 流式版本：用历史K线初始化一次，盘中每个行情只更新最后一根未完成的K线
+# update(...) 返回把当前行情当作最新一根K线时的指标值，不改变内部状态，可每个tick调用
+# commit(...) 把一根已完成的K线并入状态，seed(...) 就是依次 commit 历史K线
+# 计算口径与 MyTT 对整条序列计算后取最后一个值一致
+
+import math
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def _nan(x) -> float:
+    return np.nan if x is None else float(x)
+
+
+def _rd(x: float, D: int = 3) -> float:  # 与 MyTT.RD 相同的四舍五入
+    return float(np.round(x, D))
+
+
+class _Rolling:
+    """
+    最近 N-1 根已完成K线的滑动和，加上当前值即为N周期窗口，窗口内有nan时结果为nan
+    """
+    def __init__(self, N: int):
+        self.N = N
+        self.values = deque()
+        self.total = 0.0
+        self.nans = 0
+
+    def push(self, x: float) -> None:
+        if self.N <= 1:
+            return
+        if math.isnan(x):
+            self.nans += 1
+        else:
+            self.total += x
+        self.values.append(x)
+        if len(self.values) > self.N - 1:
+            old = self.values.popleft()
+            if math.isnan(old):
+                self.nans -= 1
+            else:
+                self.total -= old
+
+    def window_sum(self, x: float) -> float:
+        if len(self.values) < self.N - 1 or self.nans > 0 or math.isnan(x):
+            return np.nan
+        return self.total + x
+
+    def window(self, x: float) -> Optional[list]:
+        if len(self.values) < self.N - 1:
+            return None
+        return list(self.values) + [x]
+
+
+class _Extreme:
+    """
+    最近 N-1 根已完成K线的最高/最低，commit 时重算一次，盘中和当前值比较即可
+    """
+    def __init__(self, N: int, func):
+        self.N = N
+        self.func = func
+        self.values = deque(maxlen=max(N - 1, 0))
+        self.cached = np.nan
+
+    def push(self, x: float) -> None:
+        if self.N <= 1:
+            return
+        self.values.append(x)
+        # 与 np.maximum/np.minimum 一致，窗口内有 nan 则为 nan
+        self.cached = np.nan if any(math.isnan(v) for v in self.values) else self.func(self.values)
+
+    def get(self, x: float) -> float:
+        if self.N <= 1:
+            return x
+        if len(self.values) < self.N - 1 or math.isnan(x):
+            return np.nan
+        return self.func(self.cached, x)
+
+
+# ------------------ 0级：核心工具函数 --------------------------------------------
+class EMA:
+    """
+    指数移动平均 alpha=2/(N+1)，递推方式与 pandas ewm(adjust=False) 相同，包括 nan 的处理
+    """
+    def __init__(self, N: int = None, alpha: float = None):
+        com = (N - 1) / 2. if alpha is None else (1 - alpha) / alpha
+        self.alpha = 1. / (1. + com)
+        self.weighted = np.nan
+        self.old_wt = 1.
+
+    def _step(self, x: float) -> Tuple[float, float]:
+        weighted, old_wt = self.weighted, self.old_wt
+        if not math.isnan(weighted):
+            old_wt *= (1. - self.alpha)
+            if not math.isnan(x):
+                if weighted != x:
+                    weighted = (old_wt * weighted + self.alpha * x) / (old_wt + self.alpha)
+                old_wt = 1.
+        elif not math.isnan(x):
+            weighted = x
+        return weighted, old_wt
+
+    def seed(self, S) -> 'EMA':
+        for x in np.asarray(S, dtype=float):
+            self.commit(x)
+        return self
+
+    def update(self, last_price: float, high: float = None, low: float = None, volume: float = None) -> float:
+        return self._step(float(last_price))[0]
+
+    def commit(self, last_price: float, high: float = None, low: float = None, volume: float = None) -> float:
+        self.weighted, self.old_wt = self._step(float(last_price))
+        return self.weighted
+
+
+class SMA(EMA):
+    """
+    中国式SMA alpha=M/N
+    """
+    def __init__(self, N: int, M: int = 1):
+        EMA.__init__(self, alpha=M / N)
+
+
+class MA:
+    """
+    N日简单移动平均，不足N根时为nan
+    """
+    def __init__(self, N: int):
+        self.N = N
+        self.rolling = _Rolling(N)
+
+    def seed(self, S) -> 'MA':
+        for x in np.asarray(S, dtype=float):
+            self.commit(x)
+        return self
+
+    def update(self, last_price: float, high: float = None, low: float = None, volume: float = None) -> float:
+        return self.rolling.window_sum(float(last_price)) / self.N
+
+    def commit(self, last_price: float, high: float = None, low: float = None, volume: float = None) -> float:
+        value = self.update(last_price)
+        self.rolling.push(float(last_price))
+        return value
+
+
+# ------------------   2级：技术指标 ------------------------------
+class _Indicator(ABC):
+    """
+    多输入指标的公共部分，seed 按K线依次 commit
+    子类实现 _calc，commit=False 时只试算当前未收盘的K线，不改动内部状态
+    """
+    def seed(self, CLOSE, HIGH=None, LOW=None, VOLUME=None):
+        n = len(CLOSE)
+        HIGH = [None] * n if HIGH is None else HIGH
+        LOW = [None] * n if LOW is None else LOW
+        VOLUME = [None] * n if VOLUME is None else VOLUME
+        for c, h, l, v in zip(CLOSE, HIGH, LOW, VOLUME):
+            self.commit(c, h, l, v)
+        return self
+
+    @abstractmethod
+    def _calc(self, close: float, high: float, low: float, volume: float, commit: bool):
+        ...
+
+    def update(self, last_price: float, high: float = None, low: float = None, volume: float = None):
+        return self._calc(float(last_price), _nan(high), _nan(low), _nan(volume), False)
+
+    def commit(self, last_price: float, high: float = None, low: float = None, volume: float = None):
+        return self._calc(float(last_price), _nan(high), _nan(low), _nan(volume), True)
+
+
+class MACD(_Indicator):
+    """
+    返回 (DIF, DEA, MACD)，与 MyTT.MACD 一样保留3位小数
+    """
+    def __init__(self, SHORT: int = 12, LONG: int = 26, M: int = 9):
+        self.short = EMA(SHORT)
+        self.long = EMA(LONG)
+        self.dea = EMA(M)
+
+    def _calc(self, close, high, low, volume, commit):
+        step = 'commit' if commit else 'update'
+        dif = getattr(self.short, step)(close) - getattr(self.long, step)(close)
+        dea = getattr(self.dea, step)(dif)
+        return _rd(dif), _rd(dea), _rd((dif - dea) * 2)
+
+
+class KDJ(_Indicator):
+    """
+    返回 (K, D, J)，需要传入 high / low
+    """
+    def __init__(self, N: int = 9, M1: int = 3, M2: int = 3):
+        self.hhv = _Extreme(N, max)
+        self.llv = _Extreme(N, min)
+        self.k = EMA(M1 * 2 - 1)
+        self.d = EMA(M2 * 2 - 1)
+
+    def _calc(self, close, high, low, volume, commit):
+        hhv = self.hhv.get(high)
+        llv = self.llv.get(low)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsv = float(np.float64(close - llv) / np.float64(hhv - llv) * 100)
+        step = 'commit' if commit else 'update'
+        k = getattr(self.k, step)(rsv)
+        d = getattr(self.d, step)(k)
+        if commit:
+            self.hhv.push(high)
+            self.llv.push(low)
+        return k, d, k * 3 - d * 2
+
+
+class RSI(_Indicator):
+    """
+    与 MyTT.RSI 一样保留3位小数
+    """
+    def __init__(self, N: int = 24):
+        self.up = SMA(N)
+        self.all = SMA(N)
+        self.prev_close = np.nan
+
+    def _calc(self, close, high, low, volume, commit):
+        dif = close - self.prev_close
+        step = 'commit' if commit else 'update'
+        up = getattr(self.up, step)(np.nan if math.isnan(dif) else max(dif, 0))
+        all_ = getattr(self.all, step)(abs(dif))
+        if commit:
+            self.prev_close = close
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return _rd(np.float64(up) / np.float64(all_) * 100)
+
+
+class BOLL(_Indicator):
+    """
+    返回 (UPPER, MID, LOWER)，标准差为总体标准差
+    """
+    def __init__(self, N: int = 20, P: float = 2):
+        self.N = N
+        self.P = P
+        self.sums = _Rolling(N)
+        self.squares = _Rolling(N)
+        self.base = np.nan   # 去中心化的基准价，减少平方和相减的精度损失
+
+    def _calc(self, close, high, low, volume, commit):
+        if math.isnan(self.base):
+            self.base = close
+        x = close - self.base
+        mean = self.sums.window_sum(x) / self.N
+        var = self.squares.window_sum(x * x) / self.N - mean * mean
+        std = math.sqrt(max(var, 0.)) if not math.isnan(var) else np.nan
+        mid = mean + self.base
+        if commit:
+            self.sums.push(x)
+            self.squares.push(x * x)
+        return _rd(mid + std * self.P), _rd(mid), _rd(mid - std * self.P)
+
+
+class CCI(_Indicator):
+    """
+    与 MyTT.CCI 一致，平均绝对偏差需要遍历窗口，为 O(N)
+    """
+    def __init__(self, N: int = 14):
+        self.N = N
+        self.typical = _Rolling(N)
+
+    def _calc(self, close, high, low, volume, commit):
+        tp = (high + low + close) / 3
+        window = self.typical.window(tp)
+        value = np.nan
+        if window is not None:
+            W = np.asarray(window)
+            mean = W.mean()
+            with np.errstate(divide='ignore', invalid='ignore'):
+                value = float((tp - mean) / (0.015 * np.abs(W - mean).mean()))
+        if commit:
+            self.typical.push(tp)
+        return value
+
+
+class ATR(_Indicator):
+    """
+    真实波动N日平均值，需要传入 high / low
+    """
+    def __init__(self, N: int = 20):
+        self.N = N
+        self.tr = _Rolling(N)
+        self.prev_close = np.nan
+
+    def _calc(self, close, high, low, volume, commit):
+        prev = self.prev_close
+        if math.isnan(prev):
+            tr = np.nan  # 与 MyTT 一样第一根K线没有昨收，TR 为 nan
+        else:
+            tr = max(high - low, abs(prev - high), abs(prev - low))
+        value = self.tr.window_sum(tr) / self.N
+        if commit:
+            self.tr.push(tr)
+            self.prev_close = close
+        return value
@@ -0,0 +1,324 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from reader.reader_market import prefetch_ak_markets, PrefetchError
+
+
+# 单根日线的定长记录，每只股票一个文件，按日期顺序追加
+HISTORY_DTYPE = np.dtype([
+    ('datetime', np.int32),     # yyyymmdd
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.int64),
+    ('amount', np.float64),
+])
+HISTORY_FIELDS = list(HISTORY_DTYPE.names)
+
+
+def frame_to_records(df: pd.DataFrame) -> np.ndarray:
+    records = np.empty(len(df), dtype=HISTORY_DTYPE)
+    records['datetime'] = df['datetime'].astype(int).values
+    for field in HISTORY_FIELDS[1:]:
+        records[field] = df[field].values
+    return records
+
+
+def records_to_frame(records: np.ndarray, columns: List[str] = None) -> pd.DataFrame:
+    df = pd.DataFrame({field: records[field] for field in HISTORY_FIELDS})
+    df['datetime'] = df['datetime'].astype(str)
+    if columns is not None:
+        return df[columns]
+    return df
+
+
+class HistoryStore:
+    """
+    追加写的日线存储 {root}/{adjust}/{code}.bin
+    每天只补上次更新之后缺的几根K线，前复权数据发生除权时整只重下
+    """
+    def __init__(self, root: str, adjust: str = ''):
+        self.adjust = adjust
+        self.path = os.path.join(root, adjust if adjust != '' else 'none')
+        os.makedirs(self.path, exist_ok=True)
+
+        # 每只股票全量下载时请求的起始日期，起始日期可能不是交易日，不能直接用第一根K线判断
+        self.starts_path = os.path.join(self.path, 'starts.json')
+        self.starts: Dict[str, int] = {}
+        if os.path.exists(self.starts_path):
+            with open(self.starts_path, 'r') as r:
+                self.starts = json.load(r)
+
+    def save_starts(self) -> None:
+        temp_path = self.starts_path + '.tmp'
+        with open(temp_path, 'w') as w:
+            json.dump(self.starts, w)
+        os.replace(temp_path, self.starts_path)
+
+    def get_path(self, code: str) -> str:
+        return os.path.join(self.path, f'{code}.bin')
+
+    def list_codes(self) -> List[str]:
+        return sorted(name[:-4] for name in os.listdir(self.path) if name.endswith('.bin'))
+
+    def read(self, code: str) -> np.ndarray:
+        path = self.get_path(code)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=HISTORY_DTYPE)
+        return np.fromfile(path, dtype=HISTORY_DTYPE)
+
+    def read_last(self, code: str) -> Optional[np.void]:
+        # 只读文件末尾一条记录
+        path = self.get_path(code)
+        if not os.path.exists(path):
+            return None
+        count = os.path.getsize(path) // HISTORY_DTYPE.itemsize
+        if count == 0:
+            return None
+        return np.fromfile(path, dtype=HISTORY_DTYPE, count=1, offset=(count - 1) * HISTORY_DTYPE.itemsize)[0]
+
+    def append(self, code: str, records: np.ndarray) -> None:
+        with open(self.get_path(code), 'ab') as f:
+            records.tofile(f)
+
+    def write(self, code: str, records: np.ndarray) -> None:
+        path = self.get_path(code)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            records.tofile(f)
+        os.replace(temp_path, path)
+
+    def update(self, codes: List[str], start: str, end: str, raise_error: bool = False) -> Dict[str, int]:
+        """
+        补齐 [start, end] 区间，返回 { code: 新增K线数量 }
+        增量从已存的最后一天开始拉，用重叠的那根K线校验复权价格是否变化
+        raise_error 为 True 时请求失败抛出异常，已拉到的部分照常写入
+        """
+        errors = []
+        start_date = int(start)
+        end_date = int(end)
+
+        # 按需要拉取的起始日期分组，同组一起并发拉取
+        groups: Dict[str, List[str]] = {}
+        full_codes: List[str] = []
+        lasts: Dict[str, np.void] = {}
+        for code in codes:
+            last = self.read_last(code)
+            if last is None or self.starts.get(code, start_date + 1) > start_date:
+                full_codes.append(code)
+            elif int(last['datetime']) < end_date:
+                lasts[code] = last
+                groups.setdefault(str(int(last['datetime'])), []).append(code)
+
+        appended: Dict[str, int] = {}
+        for fetch_start, group_codes in groups.items():
+            print(f'[历史增量] {len(group_codes)} 只从 {fetch_start} 开始补齐')
+            try:
+                histories = prefetch_ak_markets(
+                    group_codes, fetch_start, end, columns=HISTORY_FIELDS, adjust=self.adjust, raise_error=raise_error)
+            except PrefetchError as e:
+                errors.append(e)
+                histories = e.result
+            for code in group_codes:
+                if code not in histories:
+                    continue
+                records = frame_to_records(histories[code])
+                last = lasts[code]
+                if len(records) == 0 or records[0]['datetime'] != last['datetime'] \
+                        or not np.isclose(records[0]['close'], last['close']):
+                    # 重叠的K线对不上说明复权基准变了，整只重下
+                    full_codes.append(code)
+                    continue
+                if len(records) > 1:
+                    self.append(code, records[1:])
+                appended[code] = len(records) - 1
+
+        if len(full_codes) > 0:
+            print(f'[历史全量] {len(full_codes)} 只从 {start} 开始下载')
+            try:
+                histories = prefetch_ak_markets(
+                    full_codes, start, end, columns=HISTORY_FIELDS, adjust=self.adjust, raise_error=raise_error)
+            except PrefetchError as e:
+                errors.append(e)
+                histories = e.result
+            for code, df in histories.items():
+                records = frame_to_records(df)
+                self.write(code, records)
+                self.starts[code] = start_date
+                appended[code] = len(records)
+            self.save_starts()
+
+        if len(errors) > 0:
+            raise errors[0]
+        return appended
+
+    def view(self, codes: Iterable[str], start: str, end: str, columns: List[str] = None) -> 'HistoryView':
+        return HistoryView(self, codes, start, end, columns)
+
+
+class HistoryView(Mapping):
+    """
+    { code: DataFrame } 的只读视图，第一次访问某只股票时才读文件并转成 DataFrame
+    """
+    def __init__(self, store: HistoryStore, codes: Iterable[str], start: str, end: str, columns: List[str] = None):
+        self.store = store
+        self.start_date = int(start)
+        self.end_date = int(end)
+        self.columns = columns
+        self.frames: Dict[str, pd.DataFrame] = {}
+
+        self.codes: Set[str] = set()
+        for code in codes:
+            last = store.read_last(code)
+            if last is not None and int(last['datetime']) >= self.start_date:
+                self.codes.add(code)
+
+    def __getitem__(self, code: str) -> pd.DataFrame:
+        if code not in self.codes:
+            raise KeyError(code)
+
+        df = self.frames.get(code)
+        if df is None:
+            records = self.store.read(code)
+            dates = records['datetime']
+            lo = np.searchsorted(dates, self.start_date, side='left')
+            hi = np.searchsorted(dates, self.end_date, side='right')
+            df = self.frames[code] = records_to_frame(records[lo:hi], self.columns)
+        return df
+
+    def __contains__(self, code) -> bool:
+        return code in self.codes
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+
+# ================
+# 懒加载
+# ================
+default_lazy_capacity = 256     # 最多保留多少只股票解码后的 DataFrame
+default_miss_ttl = 60           # 拉取过但没有数据的 code 多少秒内不再重拉
+
+
+class LazyHistory(Mapping):
+    """
+    首次访问某只股票时才加载的 { code: DataFrame }，已解码的按 LRU 保留
+    依次尝试：已挂载的面板 -> 本地日线存储 -> 补齐本地存储后再读
+    in 只查已加载的、面板里的和本地存储已有的，不触发拉取；需要拉取用 get / []
+    """
+    def __init__(
+        self,
+        store: HistoryStore,
+        codes: Iterable[str],
+        start: str,
+        end: str,
+        columns: List[str] = None,
+        panel: Optional[Mapping] = None,
+        capacity: int = default_lazy_capacity,
+        miss_ttl: float = default_miss_ttl,
+    ):
+        self.store = store
+        self.codes: List[str] = list(dict.fromkeys(codes))
+        self.start = start
+        self.end = end
+        self.columns = columns
+        self.panel = panel
+        self.capacity = capacity
+        self.miss_ttl = miss_ttl
+
+        self.lock = threading.Lock()            # 只保护下面几个字典，不在锁内读文件或拉网络
+        self.update_lock = threading.Lock()     # 串行补齐本地存储，starts 文件不被并发写
+        self.frames: OrderedDict[str, pd.DataFrame] = OrderedDict()
+        self.misses: Dict[str, float] = {}  # 拉取过但没有数据的 code 及过期时间，避免每个 tick 重复拉
+        self.loading: Dict[str, Future] = {}    # 正在加载的 code，同一只只拉一次，其他线程等结果
+
+    def load(self, code: str) -> Optional[pd.DataFrame]:
+        if self.panel is not None and code in self.panel:
+            return self.panel[code]
+
+        start_date = int(self.start)
+        end_date = int(self.end)
+        last = self.store.read_last(code)
+        if last is None or int(last['datetime']) < end_date or self.store.starts.get(code, start_date + 1) > start_date:
+            with self.update_lock:
+                self.store.update([code], self.start, self.end, raise_error=True)
+
+        records = self.store.read(code)
+        dates = records['datetime']
+        lo = np.searchsorted(dates, start_date, side='left')
+        hi = np.searchsorted(dates, end_date, side='right')
+        if hi <= lo:
+            return None
+        return records_to_frame(records[lo:hi], self.columns)
+
+    def get_frame(self, code: str) -> Optional[pd.DataFrame]:
+        with self.lock:
+            df = self.frames.get(code)
+            if df is not None:
+                self.frames.move_to_end(code)
+                return df
+            if self.misses.get(code, 0) > time.monotonic():
+                return None
+
+            future = self.loading.get(code)
+            owner = future is None
+            if owner:
+                future = self.loading[code] = Future()
+
+        if not owner:
+            return future.result()
+
+        # 在锁外加载，冷门股票拉网络时不阻塞其他股票的读取
+        df = None
+        try:
+            df = self.load(code)
+        except Exception as e:
+            # 网络等临时失败不记入 misses，下次访问再试
+            print(f'[懒加载] {code} 读取失败: {e}')
+        else:
+            with self.lock:
+                if df is None:
+                    self.misses[code] = time.monotonic() + self.miss_ttl
+                else:
+                    self.misses.pop(code, None)
+                    self.frames[code] = df
+                    if len(self.frames) > self.capacity:
+                        self.frames.popitem(last=False)
+        finally:
+            with self.lock:
+                self.loading.pop(code, None)
+            future.set_result(df)
+        return df
+
+    def __getitem__(self, code: str) -> pd.DataFrame:
+        df = self.get_frame(code)
+        if df is None:
+            raise KeyError(code)
+        return df
+
+    def __contains__(self, code) -> bool:
+        if code in self.frames:
+            return True
+        if self.panel is not None and code in self.panel:
+            return True
+        last = self.store.read_last(code)
+        return last is not None and int(last['datetime']) >= int(self.start)
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
@@ -1,9 +1,13 @@
-from typing import List, Optional
+import time
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
 
 import pandas as pd
 import akshare as ak
 
 from tools.utils_basic import code_to_symbol, is_stock
+from tools.utils_limiter import TokenBucket
 from reader.tushare_token import get_tushare_pro
 
 
@@ -67,6 +71,7 @@ def get_ak_market(
     end_date: str,
     columns: List[str] = None,
     adjust='',
+    raise_error: bool = False,
 ):
     if not is_stock(code):
         return None
@@ -88,7 +93,9 @@ def get_ak_market(
             '成交量': 'volume',
             '成交额': 'amount',
         })
-    except:
+    except Exception:
+        if raise_error:
+            raise
         df = []
 
     if len(df) > 0:
@@ -97,3 +104,87 @@ def get_ak_market(
             return df[columns]
         return df
     return None
+
+
+# ================
+# 并发预取
+# ================
+default_ak_workers = 8          # 线程池大小
+default_ak_rate = 10.0          # 每秒最多请求次数
+default_ak_retries = 3          # 单只股票最多尝试次数
+default_ak_backoff = 1.0        # 重试等待基数秒，按 1x 2x 4x 递增
+
+
+class PrefetchError(RuntimeError):
+    """
+    部分股票请求失败，result 为已拉到的 { code: df }，errors 为 { code: 异常 }
+    """
+    def __init__(self, result: Dict[str, pd.DataFrame], errors: Dict[str, Exception]):
+        super().__init__(f'{len(errors)} 只获取历史失败: {list(errors)[:10]}')
+        self.result = result
+        self.errors = errors
+
+
+def prefetch_ak_markets(
+    codes: List[str],
+    start_date: str,
+    end_date: str,
+    columns: List[str] = None,
+    adjust='',
+    max_workers: int = default_ak_workers,
+    rate: float = default_ak_rate,
+    retries: int = default_ak_retries,
+    backoff: float = default_ak_backoff,
+    progress_step: int = 200,
+    raise_error: bool = False,
+) -> Dict[str, pd.DataFrame]:
+    """
+    多线程限速拉取 akshare 日线，返回 { code: df }，拉不到数据的 code 不在结果里
+    raise_error 为 True 时重试后仍请求失败的 code 会在全部拉完后抛出异常，和没有数据区分开
+    """
+    codes = [code for code in codes if is_stock(code)]
+    bucket = TokenBucket(rate)
+    total = len(codes)
+
+    errors: Dict[str, Exception] = {}
+
+    def fetch(code: str) -> Optional[pd.DataFrame]:
+        for attempt in range(retries):
+            bucket.acquire()
+            try:
+                return get_ak_market(code, start_date, end_date, columns=columns, adjust=adjust, raise_error=True)
+            except Exception as e:
+                if attempt == retries - 1:
+                    print(f'[{code}] 获取历史失败: {e}')
+                    errors[code] = e
+                    return None
+                time.sleep(backoff * (2 ** attempt))
+        return None
+
+    result: Dict[str, pd.DataFrame] = {}
+    done = 0
+    failed = 0
+    t0 = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, code): code for code in codes}
+        for future in as_completed(futures):
+            code = futures[future]
+            df = future.result()
+            done += 1
+            if df is not None:
+                result[code] = df
+            else:
+                failed += 1
+
+            if done % progress_step == 0 or done == total:
+                elapsed = time.monotonic() - t0
+                eta = elapsed / done * (total - done)
+                print(f'[历史预取] {done}/{total} 失败{failed} '
+                      f'已用{datetime.timedelta(seconds=int(elapsed))} '
+                      f'剩余{datetime.timedelta(seconds=int(eta))} '
+                      f'{done / elapsed if elapsed > 0 else 0:.1f}只/秒')
+
+    if raise_error and len(errors) > 0:
+        raise PrefetchError(result, errors)
+    return result
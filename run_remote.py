@@ -8,7 +8,9 @@ from credentials import *
 from tools.utils_basic import logging_init, is_stock
 from tools.utils_cache import *
 from tools.utils_ding import DingMessager
+from tools.utils_panel import PANEL_CACHE_PATH, HISTORY_CACHE_PATH
 
+from delegate.base_delegate import BasketOrder
 from delegate.xt_delegate import xt_get_ticks
 from delegate.xt_subscriber import XtSubscriber, update_position_held
 
@@ -34,6 +36,8 @@ PATH_HELD = PATH_BASE + '/held_days.json'       # 记录持仓日期
 PATH_MAXP = PATH_BASE + '/max_price.json'       # 记录历史最高
 PATH_LOGS = PATH_BASE + '/logs.txt'             # 用来存储选股和委托操作
 PATH_INFO = PATH_BASE + '/temp_{}.pkl'          # 用来缓存当天的指标信息
+PATH_HIST = HISTORY_CACHE_PATH                  # 本地日线存储，所有策略共用，每天增量追加
+PATH_PANEL = PANEL_CACHE_PATH                   # 按日写一次的日线面板，所有策略进程 mmap 共享
 
 lock_of_disk_cache = threading.Lock()           # 操作磁盘文件缓存的锁
 
@@ -125,14 +129,11 @@ def refresh_code_list():
     my_suber.update_code_list(my_pool.get_code_list() + hold_list)
 
 
-def prepare_history() -> None:
+def prepare_history(lazy: bool = False) -> None:
     if not check_today_is_open_day(datetime.datetime.now().strftime('%Y-%m-%d')):
         return
 
     now = datetime.datetime.now()
-    curr_date = now.strftime('%Y-%m-%d')
-    cache_path = PATH_INFO.format(curr_date)
-
     start = get_prev_trading_date(now, PoolParameters.day_count)
     end = get_prev_trading_date(now, 1)
 
@@ -140,8 +141,10 @@ def prepare_history() -> None:
     positions = xt_delegate.check_positions()
     holding_list = [position.stock_code for position in positions if is_stock(position.stock_code)]
 
-    my_suber.download_cache_history(
-        cache_path=cache_path,
+    prepare = my_suber.attach_lazy_history if lazy else my_suber.download_panel_history
+    prepare(
+        panel_path=PATH_PANEL,
+        store_path=PATH_HIST,
         code_list=holding_list,
         start=start,
         end=end,
@@ -214,6 +217,7 @@ def scan_buy(quotes: Dict, curr_date: str, positions: List) -> None:
         buy_count = min(buy_count, BuyParameters.once_buy_limit)        # 限制一秒内下单数量
         buy_count = int(buy_count)
 
+        basket = []
         for i in range(len(selections)):  # 依次买入
             # logging.info(f'买数相关：持仓{position_count} 现金{available_cash} 已选{len(selections)}')
             if buy_count > 0:
@@ -231,10 +235,13 @@ def scan_buy(quotes: Dict, curr_date: str, positions: List) -> None:
                 else:
                     buy_count = buy_count - 1
                     # 如果今天未被选股过 and 目前没有持仓则记录（意味着不会加仓
-                    my_buyer.order_buy(code=code, price=price, last_close=last_close, volume=buy_volume, remark='选股买单')
+                    basket.append(BasketOrder(
+                        code=code, price=price, last_close=last_close, volume=buy_volume, remark='选股买单', is_buy=True))
             else:
                 break
 
+        my_buyer.order_buy_basket(basket)
+
     # 记录选股历史
     if curr_date not in cache_selected:
         cache_selected[curr_date] = set()
@@ -250,7 +257,7 @@ def scan_buy(quotes: Dict, curr_date: str, positions: List) -> None:
 
 def scan_sell(quotes: Dict, curr_date: str, curr_time: str, positions: List) -> None:
     max_prices, held_days = update_max_prices(lock_of_disk_cache, quotes, positions, PATH_MAXP, PATH_HELD)
-    my_seller.execute_sell(quotes, curr_date, curr_time, positions, held_days, max_prices, my_suber.cache_history)
+    my_seller.execute_sell_batch(quotes, curr_date, curr_time, positions, held_days, max_prices, my_suber.cache_history)
 
 
 # ======== 框架 ========
@@ -293,6 +300,9 @@ if __name__ == '__main__':
             account_id=QMT_ACCOUNT_ID,
             client_path=QMT_CLIENT_PATH,
             callback=xt_callback,
+            open_account_book=True,
+            open_async_order=True,
+            open_order_scheduler=True,
         )
     else:
         from delegate.gm_callback import GmCallback
@@ -353,7 +363,7 @@ if __name__ == '__main__':
     if '09:05' < temp_time < '15:30' and check_today_is_open_day(temp_date):
         held_increase()
         refresh_code_list()
-        prepare_history()  # 重启时防止没有数据在这先加载历史数据
+        prepare_history(lazy=True)  # 重启时防止没有数据在这先挂载历史数据，用到时再加载
 
         if '09:15' <= temp_time <= '11:30' or '13:00' <= temp_time <= '14:57':
             my_suber.subscribe_tick()  # 重启时如果在交易时间则订阅Tick
@@ -8,6 +8,7 @@ from credentials import *
 from tools.utils_basic import logging_init, is_stock
 from tools.utils_cache import *
 from tools.utils_ding import DingMessager
+from tools.utils_panel import PANEL_CACHE_PATH, HISTORY_CACHE_PATH
 
 from delegate.xt_subscriber import XtSubscriber, update_position_held
 
@@ -31,11 +32,12 @@ PATH_DEAL = PATH_BASE + '/deal_hist.csv'        # 记录历史成交
 PATH_HELD = PATH_BASE + '/held_days.json'       # 记录持仓日期
 PATH_MAXP = PATH_BASE + '/max_price.json'       # 记录历史最高
 PATH_LOGS = PATH_BASE + '/logs.txt'             # 用来存储选股和委托操作
+PATH_HIST = HISTORY_CACHE_PATH                  # 本地日线存储，所有策略共用，每天增量追加
+PATH_PANEL = PANEL_CACHE_PATH                   # 按日写一次的日线面板，所有策略进程 mmap 共享
 
 lock_of_disk_cache = threading.Lock()           # 操作磁盘文件缓存的锁
 
 cache_selected: Dict[str, Set] = {}             # 记录选股历史，去重
-cache_history: Dict[str, pd.DataFrame] = {}     # 记录历史日线行情的信息 { code: DataFrame }
 
 
 def debug(*args):
@@ -49,6 +51,10 @@ class PoolParameters:
     ]
     black_queries = ['ST', '退市']
 
+    day_count = 110         # 与其他策略一致，共用同一份日线面板
+    price_adjust = 'qfq'    # 历史价格复权
+    columns = ['datetime', 'open', 'high', 'low', 'close', 'volume', 'amount']
+
 
 class BuyParameters:
     time_ranges = [['10:30', '11:30'], ['13:00', '14:57']]
@@ -110,6 +116,30 @@ def refresh_code_list():
     my_suber.update_code_list(my_pool.get_code_list() + hold_list)
 
 
+def prepare_history(lazy: bool = False) -> None:
+    if not check_today_is_open_day(datetime.datetime.now().strftime('%Y-%m-%d')):
+        return
+
+    now = datetime.datetime.now()
+    start = get_prev_trading_date(now, PoolParameters.day_count)
+    end = get_prev_trading_date(now, 1)
+
+    # 只有持仓列表
+    positions = xt_delegate.check_positions()
+    holding_list = [position.stock_code for position in positions if is_stock(position.stock_code)]
+
+    prepare = my_suber.attach_lazy_history if lazy else my_suber.download_panel_history
+    prepare(
+        panel_path=PATH_PANEL,
+        store_path=PATH_HIST,
+        code_list=holding_list,
+        start=start,
+        end=end,
+        adjust=PoolParameters.price_adjust,
+        columns=PoolParameters.columns,
+    )
+
+
 # ======== 买点 ========
 
 
@@ -204,7 +234,7 @@ def scan_buy(quotes: Dict, curr_date: str, positions: List) -> None:
 
 def scan_sell(quotes: Dict, curr_date: str, curr_time: str, positions: List) -> None:
     max_prices, held_days = update_max_prices(lock_of_disk_cache, quotes, positions, PATH_MAXP, PATH_HELD)
-    my_seller.execute_sell(quotes, curr_date, curr_time, positions, held_days, max_prices, cache_history)
+    my_seller.execute_sell_batch(quotes, curr_date, curr_time, positions, held_days, max_prices, my_suber.cache_history)
 
 
 # ======== 框架 ========
@@ -302,10 +332,12 @@ if __name__ == '__main__':
     # 定时任务启动
     schedule.every().day.at('09:00').do(held_increase)
     schedule.every().day.at('09:05').do(refresh_code_list)
+    schedule.every().day.at('09:10').do(prepare_history)    # 在 refresh code list 之后
 
     if '09:05' < temp_time < '15:30' and check_today_is_open_day(temp_date):
         held_increase()
         refresh_code_list()
+        prepare_history(lazy=True)  # 重启时防止没有数据在这先挂载历史数据，用到时再加载
 
         if '09:15' <= temp_time <= '11:30' or '13:00' <= temp_time <= '14:57':
             my_suber.subscribe_tick()  # 重启时如果在交易时间则订阅Tick
@@ -1,5 +1,6 @@
 import datetime
 import logging
+import numpy as np
 import pandas as pd
 
 
@@ -192,6 +193,23 @@ def get_limit_down_price(code: str, pre_close: float) -> float:
     return float(limit)
 
 
+# 批量计算涨跌停价，与 get_limit_up_price / get_limit_down_price 逐个计算的结果一致
+def get_limiting_rates(codes: list, up: bool) -> np.ndarray:
+    codes = np.asarray(codes, dtype=str)
+    wide = np.isin(np.char.ljust(codes, 2).astype('<U2'), ['30', '68'])
+    bj = np.char.startswith(codes, '8')
+    if up:
+        return np.where(wide, 1.2, np.where(bj, 1.3, 1.1))
+    return np.where(wide, 0.8, np.where(bj, 0.7, 0.9))
+
+
+def get_limit_prices(codes: list, pre_closes: np.ndarray, up: bool) -> np.ndarray:
+    pre_closes = np.asarray(pre_closes, dtype=np.float64)
+    limits = pre_closes * get_limiting_rates(codes, up)
+    limits = np.char.mod('%.2f', limits).astype(np.float64)  # 与 '%.2f' 的舍入方式保持一致
+    return np.where(pre_closes == 0, 0.0, limits)
+
+
 def time_diff_seconds(later_time: datetime.datetime.time, early_time: datetime.datetime.time):
     # 将时间转换为总秒数
     total_seconds_time1 = later_time.hour * 3600 + later_time.minute * 60 + later_time.second
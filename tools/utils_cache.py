@@ -1,15 +1,20 @@
 import os
 import csv
 import json
+import atexit
 import pickle
 import threading
+import time
 import datetime
-from typing import List, Dict, Set, Optional
+from collections import OrderedDict
+from typing import Callable, List, Dict, Set, Optional
 
+import numpy as np
 import pandas as pd
 import akshare as ak
 
 from tools.utils_basic import symbol_to_code
+from tools.utils_quotes import ColumnarQuotes
 
 trade_day_cache = {}
 trade_max_year_key = 'max_year'
@@ -63,42 +68,319 @@ def save_json(path: str, var: dict) -> None:
         w.write(json.dumps(var, indent=4))
 
 
+default_flush_debounce = 1.0   # 持仓状态变更后延迟落盘的秒数，期间的多次变更合并成一次写
+default_file_lock_timeout = 10  # 等待跨进程文件锁的最长秒数
+default_file_lock_stale = 30    # 锁文件存在超过该秒数视为持有进程已退出
+
+
+class FileLock:
+    """
+    跨进程的文件锁，用 O_EXCL 创建 {path}.lock，Windows 和 Linux 通用
+    """
+    def __init__(
+        self,
+        path: str,
+        timeout: float = default_file_lock_timeout,
+        stale: float = default_file_lock_stale,
+    ):
+        self.lock_path = path + '.lock'
+        self.timeout = timeout
+        self.stale = stale
+
+    def __enter__(self) -> 'FileLock':
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                os.close(os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.lock_path) > self.stale:
+                        os.remove(self.lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f'等待文件锁超时 {self.lock_path}')
+                time.sleep(0.01)
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        try:
+            os.remove(self.lock_path)
+        except OSError:
+            pass
+
+
+class PositionStateStore:
+    """
+    持仓状态 json（held_days.json / max_price.json）的内存副本，多个策略进程可共用同一文件
+    读之前检查文件的修改时间，别的进程写过就重新加载，再补上本进程还没落盘的变更
+    变更由后台定时器延迟 debounce 秒落盘，落盘时持文件锁、与磁盘最新内容合并后原子替换
+    """
+    def __init__(self, path: str, debounce: float = default_flush_debounce):
+        self.path = path
+        self.debounce = debounce
+        self.lock = threading.Lock()        # 保护内存数据
+        self.flush_lock = threading.Lock()  # 保证同一时间只有一个写盘
+        self.data: dict = {}
+        self.stamp = None                   # 上次加载时文件的 (mtime_ns, size)
+        self.pending: List[tuple] = []      # 还没落盘的变更 ('set', items) / ('del', keys)
+        self.timer: Optional[threading.Timer] = None
+        with self.lock:
+            self._reload()
+
+    def _get_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _reload(self) -> None:
+        # 调用方已持有 self.lock，读磁盘最新内容并重放本进程未落盘的变更
+        self.stamp = self._get_stamp()
+        data = load_json(self.path) if self.stamp is not None else {}
+        for op, value in self.pending:
+            self._apply(data, op, value)
+        self.data = data
+
+    def _refresh(self) -> None:
+        if self._get_stamp() != self.stamp:
+            self._reload()
+
+    @staticmethod
+    def _apply(data: dict, op: str, value) -> None:
+        if op == 'set':
+            data.update(value)
+        else:
+            for key in value:
+                data.pop(key, None)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            self._refresh()
+            return dict(self.data)
+
+    def set_items(self, items: dict) -> None:
+        if len(items) == 0:
+            return
+        with self.lock:
+            self._refresh()
+            items = dict(items)
+            self._apply(self.data, 'set', items)
+            self.pending.append(('set', items))
+            self._mark_dirty()
+
+    def delete_keys(self, keys: List[str]) -> None:
+        with self.lock:
+            self._refresh()
+            keys = [key for key in keys if key in self.data]
+            if len(keys) > 0:
+                self._apply(self.data, 'del', keys)
+                self.pending.append(('del', keys))
+                self._mark_dirty()
+
+    def transact(self, func: Callable[[dict], object]):
+        """
+        持文件锁读最新内容，func 原地修改后立即落盘，返回 func 的返回值
+        用于先判断再修改的操作，避免多个进程基于旧数据互相覆盖
+        """
+        with self.flush_lock, FileLock(self.path):
+            with self.lock:
+                self._reload()
+                result = func(self.data)
+                self._write()
+            return result
+
+    def _mark_dirty(self) -> None:
+        # 调用方已持有 self.lock
+        if self.timer is None:
+            self.timer = threading.Timer(self.debounce, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def _write(self) -> None:
+        # 调用方已持有 self.lock 和文件锁
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        temp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(temp_path, 'w') as w:
+            w.write(json.dumps(self.data, indent=4))
+        os.replace(temp_path, self.path)
+        self.pending.clear()
+        self.stamp = self._get_stamp()
+
+    def flush(self) -> None:
+        with self.flush_lock, FileLock(self.path):
+            with self.lock:
+                self._reload()
+                self._write()
+
+
+state_stores: Dict[str, PositionStateStore] = {}
+state_stores_lock = threading.Lock()
+
+
+def get_state_store(path: str) -> PositionStateStore:
+    with state_stores_lock:
+        if path not in state_stores:
+            state_stores[path] = PositionStateStore(path)
+        return state_stores[path]
+
+
+@atexit.register
+def flush_state_stores() -> None:
+    for store in list(state_stores.values()):
+        if len(store.pending) > 0:
+            store.flush()
+
+
+# ================
+# 指标结果缓存
+# ================
+default_indicator_capacity = 1024   # 内存中最多保留多少条指标结果
+
+
+def get_last_bar(df: pd.DataFrame, date_column: str = 'datetime', close_column: str = 'close') -> Optional[tuple]:
+    # 用 (日期, 收盘价) 标识最后一根K线，盘中未完成的K线价格变了也能区分出来
+    if df is None or len(df) == 0:
+        return None
+    return str(df[date_column].values[-1]), float(df[close_column].values[-1])
+
+
+def get_daily_bar_key(now: datetime.datetime) -> Optional[str]:
+    # 按当前时间推断日线最后一根K线，开盘前为上一交易日，收盘后为当天，盘中K线未完成返回 None 不缓存
+    curr_date = now.strftime('%Y%m%d')
+    curr_time = now.strftime('%H:%M')
+    if curr_time < '09:15':
+        return f'{curr_date}-pre'
+    if curr_time >= '15:30':
+        return f'{curr_date}-post'
+    return None
+
+
+class IndicatorCache:
+    """
+    指标计算结果的 LRU 缓存，key 为 (code, 函数名, 参数, 最后一根K线)
+    没有新K线时直接返回上次结果，path 不为空时退出前落盘，下次启动时加载
+    """
+    def __init__(self, capacity: int = default_indicator_capacity, path: str = None):
+        self.capacity = capacity
+        self.path = path
+        self.lock = threading.Lock()
+        self.items: OrderedDict[tuple, object] = OrderedDict()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+
+        if path is not None:
+            loaded = load_pickle(path)
+            if loaded is not None:
+                self.items.update(loaded)
+                while len(self.items) > self.capacity:
+                    self.items.popitem(last=False)
+            indicator_caches.append(self)
+
+    @staticmethod
+    def make_key(code: str, func, params, last_bar) -> tuple:
+        name = func if isinstance(func, str) else func.__name__
+        if isinstance(params, dict):
+            params = tuple(sorted(params.items()))
+        elif not isinstance(params, tuple):
+            params = (params, )
+        return code, name, params, last_bar
+
+    def get(self, key: tuple, default=None):
+        with self.lock:
+            if key in self.items:
+                self.items.move_to_end(key)
+                self.hits += 1
+                return self.items[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: tuple, value) -> None:
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            if len(self.items) > self.capacity:
+                self.items.popitem(last=False)
+            self.dirty = True
+
+    def get_or_compute(self, code: str, func, params, last_bar, compute: Callable = None):
+        """
+        命中则返回缓存，否则调用 compute()（默认为 func(*params)）并缓存
+        last_bar 为 None 表示最后一根K线还没走完，直接计算不缓存
+        """
+        if compute is None:
+            compute = lambda: func(*params)
+        if last_bar is None:
+            return compute()
+
+        key = self.make_key(code, func, params, last_bar)
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        with self.lock:
+            self.items.clear()
+            self.dirty = True
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self.lock:
+            items = dict(self.items)
+            self.dirty = False
+        temp_path = self.path + '.tmp'
+        save_pickle(temp_path, items)
+        os.replace(temp_path, self.path)
+
+
+indicator_caches: List[IndicatorCache] = []
+indicator_cache = IndicatorCache()  # 进程内共享，只在内存中
+
+
+@atexit.register
+def save_indicator_caches() -> None:
+    for cache in list(indicator_caches):
+        if cache.dirty:
+            cache.save()
+
+
 def del_key(lock: threading.Lock, path: str, key: str) -> None:
     with lock:
-        temp_json = load_json(path)
-        if key in temp_json:
-            del temp_json[key]
-        save_json(path, temp_json)
+        get_state_store(path).delete_keys([key])
 
 
 def del_keys(lock: threading.Lock, path: str, keys: List[str]) -> None:
     with lock:
-        temp_json = load_json(path)
-        for key in keys:
-            if key in temp_json:
-                del temp_json[key]
-        save_json(path, temp_json)
+        get_state_store(path).delete_keys(keys)
 
 
 # 所有缓存持仓天数+1
 def all_held_inc(held_operation_lock: threading.Lock, path: str) -> bool:
-    with held_operation_lock:
-        held_days = load_json(path)
+    today = datetime.datetime.now().strftime('%Y-%m-%d')
+    inc_date_key = '_inc_date'
 
-        today = datetime.datetime.now().strftime('%Y-%m-%d')
-        inc_date_key = '_inc_date'
+    def inc(held_days: dict) -> bool:
+        # 在文件锁内判断当天是否已经加过，多个进程只会有一个真正执行
+        if (inc_date_key in held_days) and (held_days[inc_date_key] == today):
+            return False
+        for code in held_days.keys():
+            if code != inc_date_key:
+                held_days[code] += 1
+        held_days[inc_date_key] = today
+        return True
 
+    with held_operation_lock:
         try:
-            if (inc_date_key not in held_days) or (held_days[inc_date_key] != today):
-                held_days[inc_date_key] = today
-                for code in held_days.keys():
-                    if code != inc_date_key:
-                        held_days[code] += 1
-
-                save_json(path, held_days)
-                return True
-            else:
-                return False
+            return get_state_store(path).transact(inc)
         except:
             return False
 
@@ -106,10 +388,7 @@ def all_held_inc(held_operation_lock: threading.Lock, path: str) -> bool:
 # 增加新的持仓记录
 def new_held(held_operation_lock: threading.Lock, path: str, codes: List[str]) -> None:
     with held_operation_lock:
-        held_days = load_json(path)
-        for code in codes:
-            held_days[code] = 0
-        save_json(path, held_days)
+        get_state_store(path).set_items({code: 0 for code in codes})
 
 
 # 更新持仓股买入次日开始最高价格
@@ -121,13 +400,18 @@ def update_max_prices(
     path_held_days: str,
     ignore_open_day: bool = True,
 ):
-    held_days = load_json(path_held_days)
+    if isinstance(quotes, ColumnarQuotes):
+        max_prices, held_days, _ = update_max_prices_batch(
+            lock, quotes, positions, path_max_prices, path_held_days, ignore_open_day)
+        return max_prices, held_days
 
-    with lock:
-        max_prices = load_json(path_max_prices)
+    held_days = get_state_store(path_held_days).snapshot()
+
+    max_prices_store = get_state_store(path_max_prices)
+    max_prices = max_prices_store.snapshot()
 
     # 更新历史最高
-    updated = False
+    updated = {}
     for position in positions:
         code = position.stock_code
         if code in held_days:  # 只更新持仓超过一天的
@@ -142,18 +426,59 @@ def update_max_prices(
                 if code in max_prices:
                     if max_prices[code] < high_price:
                         max_prices[code] = round(high_price, 3)
-                        updated = True
+                        updated[code] = max_prices[code]
                 else:
                     max_prices[code] = round(high_price, 3)
-                    updated = True
+                    updated[code] = max_prices[code]
 
-    if updated:
+    if len(updated) > 0:
         with lock:
-            save_json(path_max_prices, max_prices)
+            max_prices_store.set_items(updated)
 
     return max_prices, held_days
 
 
+# 列式行情下批量更新所有持仓的历史最高，返回有变化的code
+def update_max_prices_batch(
+    lock: threading.Lock,
+    quotes: ColumnarQuotes,
+    positions: list,
+    path_max_prices: str,
+    path_held_days: str,
+    ignore_open_day: bool = True,
+) -> (dict, dict, List[str]):
+    held_days = get_state_store(path_held_days).snapshot()
+
+    max_prices_store = get_state_store(path_max_prices)
+    max_prices = max_prices_store.snapshot()
+
+    # 只更新有持仓天数记录的，忽略开仓日的最高价
+    codes = [
+        position.stock_code for position in positions
+        if position.stock_code in held_days and (not ignore_open_day or held_days[position.stock_code] > 0)
+    ]
+    rows = quotes.get_rows(codes)
+    has_quote = rows >= 0
+    if not has_quote.any():
+        return max_prices, held_days, []
+
+    codes = np.array(codes, dtype=object)[has_quote]
+    highs = quotes.column('high')[rows[has_quote]]
+    prev_max = np.array([max_prices.get(code, -np.inf) for code in codes], dtype=np.float64)
+
+    dirty = highs > prev_max
+    new_max = np.round(np.maximum(prev_max, highs), 3)
+
+    dirty_codes = codes[dirty].tolist()
+    if len(dirty_codes) > 0:
+        updated = dict(zip(dirty_codes, new_max[dirty].tolist()))
+        max_prices.update(updated)
+        with lock:
+            max_prices_store.set_items(updated)
+
+    return max_prices, held_days, dirty_codes
+
+
 # 记录成交单
 def record_deal(
     lock: threading.Lock,
@@ -182,6 +507,27 @@ def record_deal(
             ])
 
 
+# 一次写入多条委托记录，rows 的字段与 record_deal 的参数相同
+def record_deals(lock: threading.Lock, path: str, rows: List[dict]):
+    if len(rows) == 0:
+        return
+
+    with lock:
+        if not os.path.exists(path):
+            with open(path, 'w') as w:
+                w.write(','.join(['日期', '时间', '代码', '名称', '类型', '注释', '成交价', '成交量']))
+                w.write('\n')
+
+        with open(path, 'a+', newline='') as w:
+            wf = csv.writer(w)
+            for row in rows:
+                dt = datetime.datetime.fromtimestamp(int(row['timestamp']))
+                wf.writerow([
+                    dt.date(), dt.time(),
+                    row['code'], row['name'], row['order_type'], row['remark'], row['price'], row['volume']
+                ])
+
+
 # 获取磁盘缓存的交易日列表
 def get_disk_trade_day_list_and_update_max_year() -> list:
     # 读磁盘，这里可以有内存缓存的速度优化
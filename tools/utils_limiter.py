@@ -0,0 +1,63 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶限速器
+    rate 为每秒补充的令牌数，capacity 为允许的最大突发量
+    """
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def wait(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        # 阻塞直到桶里有足够令牌但不取走，超时返回 False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+
+            if deadline is not None:
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                wait = min(wait, remain)
+            time.sleep(wait)
+
+    def acquire(self, tokens: float = 1.0, timeout: float = None) -> bool:
+        # 阻塞直到拿到令牌，超时返回 False
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return True
+                wait = (tokens - self.tokens) / self.rate
+
+            if deadline is not None:
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                wait = min(wait, remain)
+            time.sleep(wait)
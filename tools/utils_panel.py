@@ -0,0 +1,143 @@
+import os
+import json
+import uuid
+import bisect
+import shutil
+from collections.abc import Mapping
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+PANEL_FLOAT_FIELDS = ['open', 'high', 'low', 'close', 'amount']
+PANEL_INT_FIELDS = ['volume']
+
+PANEL_CACHE_PATH = '_cache/_panel'      # 所有策略进程共用的面板目录
+HISTORY_CACHE_PATH = '_cache/_history'  # 所有策略进程共用的本地日线存储
+
+
+def get_panel_path(panel_path: str, end: str, adjust: str) -> str:
+    # 同一交易日同一复权方式只有一份面板，各策略按自己的起始日期切片、缺的股票再从日线存储补
+    return os.path.join(panel_path, f'{end}_{adjust if adjust != "" else "none"}')
+
+
+def write_panel(path: str, histories: Mapping, codes: List[str] = None, start: str = None) -> int:
+    """
+    把 { code: DataFrame } 写成面板目录 path/
+    floats.npy 形状 (字段, 股票, 交易日) float64，停牌缺失为 NaN
+    volumes.npy 形状 (股票, 交易日) int64，缺失为 0
+    meta.json 记录 codes / dates / fields / start，先写临时目录再整体替换，读的进程不会看到写了一半的文件
+    """
+    codes = [code for code in (codes if codes is not None else histories.keys()) if code in histories]
+    frames = [histories[code] for code in codes]
+    dates = sorted(set().union(*[set(df['datetime'].astype(str)) for df in frames])) if len(frames) > 0 else []
+    date_cols = {date: i for i, date in enumerate(dates)}
+
+    temp_path = f'{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'   # 每次写入独立的临时目录，多进程同时写互不干扰
+    os.makedirs(temp_path)
+
+    shape = (len(codes), len(dates))
+    floats = np.lib.format.open_memmap(
+        os.path.join(temp_path, 'floats.npy'), mode='w+', dtype=np.float64, shape=(len(PANEL_FLOAT_FIELDS),) + shape)
+    volumes = np.lib.format.open_memmap(
+        os.path.join(temp_path, 'volumes.npy'), mode='w+', dtype=np.int64, shape=shape)
+    floats[:] = np.nan
+    volumes[:] = 0
+
+    for row, df in enumerate(frames):
+        cols = np.fromiter((date_cols[date] for date in df['datetime'].astype(str)), dtype=np.int64, count=len(df))
+        for i, field in enumerate(PANEL_FLOAT_FIELDS):
+            floats[i, row, cols] = df[field].values
+        volumes[row, cols] = df['volume'].values
+
+    floats.flush()
+    volumes.flush()
+    del floats, volumes
+
+    with open(os.path.join(temp_path, 'meta.json'), 'w') as w:
+        json.dump({
+            'codes': codes,
+            'dates': dates,
+            'float_fields': PANEL_FLOAT_FIELDS,
+            'int_fields': PANEL_INT_FIELDS,
+            'start': start if start is not None else (dates[0] if len(dates) > 0 else None),
+        }, w)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(temp_path, path)
+    return len(codes)
+
+
+def panel_exists(path: str) -> bool:
+    return os.path.exists(os.path.join(path, 'meta.json'))
+
+
+def panel_covers(path: str, start: str) -> bool:
+    # 面板写入时的起始日期不晚于 start 才能切出完整区间
+    if not panel_exists(path):
+        return False
+    with open(os.path.join(path, 'meta.json'), 'r') as r:
+        panel_start = json.load(r).get('start')
+    return panel_start is not None and str(panel_start) <= str(start)
+
+
+class HistoryPanel(Mapping):
+    """
+    只读挂载的日线面板，多个策略进程共享同一份 mmap 文件，不各自加载 pickle
+    按 code 取 DataFrame 时才从 mmap 切出该行，field(name) 返回 (股票, 交易日) 二维视图
+    传入 start 时只暴露 start 之后的交易日，切片仍是 mmap 上的视图
+    """
+    def __init__(self, path: str, columns: List[str] = None, start: str = None):
+        self.path = path
+        self.columns = columns
+
+        with open(os.path.join(path, 'meta.json'), 'r') as r:
+            meta = json.load(r)
+        first = 0 if start is None else bisect.bisect_left(meta['dates'], str(start))
+        self.codes: List[str] = meta['codes']
+        self.dates: List[str] = meta['dates'][first:]
+        self.float_fields: Dict[str, int] = {field: i for i, field in enumerate(meta['float_fields'])}
+        self.code_rows: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+
+        self.floats = np.load(os.path.join(path, 'floats.npy'), mmap_mode='r')[:, :, first:]
+        self.volumes = np.load(os.path.join(path, 'volumes.npy'), mmap_mode='r')[:, first:]
+        self.frames: Dict[str, pd.DataFrame] = {}
+
+    def field(self, name: str) -> np.ndarray:
+        if name == 'volume':
+            return self.volumes
+        return self.floats[self.float_fields[name]]
+
+    def get_row(self, code: str) -> Optional[int]:
+        return self.code_rows.get(code)
+
+    def get_arrays(self, code: str) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        # 返回该股票有数据的交易日下标和各字段数组
+        row = self.code_rows[code]
+        cols = np.flatnonzero(~np.isnan(self.floats[self.float_fields['close'], row]))
+        arrays = {field: self.floats[i, row, cols] for field, i in self.float_fields.items()}
+        arrays['volume'] = self.volumes[row, cols]
+        return cols, arrays
+
+    def __getitem__(self, code: str) -> pd.DataFrame:
+        df = self.frames.get(code)
+        if df is None:
+            cols, arrays = self.get_arrays(code)
+            df = pd.DataFrame({'datetime': [self.dates[i] for i in cols]})
+            for field in ['open', 'high', 'low', 'close', 'volume', 'amount']:
+                df[field] = arrays[field]
+            if self.columns is not None:
+                df = df[self.columns]
+            self.frames[code] = df
+        return df
+
+    def __contains__(self, code) -> bool:
+        return code in self.code_rows
+
+    def __iter__(self):
+        return iter(self.codes)
+
+    def __len__(self) -> int:
+        return len(self.codes)
@@ -0,0 +1,132 @@
+from collections.abc import Mapping
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+
+# 列式行情缓存的字段，浮点列与整数列分开存放
+QUOTE_FLOAT_FIELDS = ['lastPrice', 'open', 'high', 'low', 'lastClose', 'amount']
+QUOTE_INT_FIELDS = ['volume', 'time']
+QUOTE_FIELDS = QUOTE_FLOAT_FIELDS + QUOTE_INT_FIELDS
+
+default_quote_capacity = 6000   # 全市场股票数量级，不够时自动翻倍
+
+
+def get_quote_field(quote: Dict, field: str, fill):
+    value = quote.get(field)
+    return fill if value is None else value
+
+
+class QuoteRow(Mapping):
+    """
+    单只股票的只读行视图，兼容 quote['lastPrice'] 的字典写法
+    """
+    __slots__ = ('_columns', '_row')
+
+    def __init__(self, columns: Dict[str, np.ndarray], row: int):
+        self._columns = columns
+        self._row = row
+
+    def __getitem__(self, field: str):
+        return self._columns[field][self._row].item()
+
+    def __iter__(self):
+        return iter(QUOTE_FIELDS)
+
+    def __len__(self) -> int:
+        return len(QUOTE_FIELDS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class ColumnarQuotes(Mapping):
+    """
+    预分配 NumPy 列的行情缓存 { code: QuoteRow }
+    每次推送原地更新对应行，不再为每个 tick 生成新的字典
+    """
+    def __init__(self, capacity: int = default_quote_capacity):
+        self.code_rows: Dict[str, int] = {}     # code -> 行号
+        self.row_codes: List[str] = []          # 行号 -> code
+        self.columns: Dict[str, np.ndarray] = {}
+        self.valid = np.zeros(capacity, dtype=bool)    # 上次清空后有推送的行
+        self.count = 0
+
+        for field in QUOTE_FLOAT_FIELDS:
+            self.columns[field] = np.full(capacity, np.nan, dtype=np.float64)
+        for field in QUOTE_INT_FIELDS:
+            self.columns[field] = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self, capacity: int) -> None:
+        size = len(self.valid)
+        for field, column in self.columns.items():
+            fill = np.nan if column.dtype == np.float64 else 0
+            self.columns[field] = np.concatenate([column, np.full(capacity - size, fill, dtype=column.dtype)])
+        self.valid = np.concatenate([self.valid, np.zeros(capacity - size, dtype=bool)])
+
+    def _get_row(self, code: str) -> int:
+        row = self.code_rows.get(code)
+        if row is None:
+            row = len(self.row_codes)
+            if row >= len(self.valid):
+                self._grow(len(self.valid) * 2)
+            self.code_rows[code] = row
+            self.row_codes.append(code)
+        return row
+
+    def update(self, quotes: Dict[str, Dict]) -> None:
+        n = len(quotes)
+        if n == 0:
+            return
+
+        # 先读出所有字段再分配行号，指数、停牌等推送缺字段时按缺失值填，不留下写了一半的行
+        values = quotes.values()
+        fields = {}
+        for field, column in self.columns.items():
+            fill = np.nan if column.dtype == np.float64 else 0
+            fields[field] = np.fromiter(
+                (get_quote_field(quote, field, fill) for quote in values), dtype=column.dtype, count=n)
+
+        rows = np.fromiter((self._get_row(code) for code in quotes), dtype=np.int64, count=n)
+        for field, column in self.columns.items():
+            column[rows] = fields[field]
+
+        self.valid[rows] = True
+        self.count = int(np.count_nonzero(self.valid))
+
+    def update_missing(self, other: 'ColumnarQuotes') -> None:
+        # 只补回本缓存没有的 code，已有的保留本缓存里更新的数据
+        missing = [code for code in other if code not in self]
+        self.update({code: other[code] for code in missing})
+
+    def clear(self) -> None:
+        # 只清标记，保留已分配的列和行号
+        self.valid[:] = False
+        self.count = 0
+
+    def get_rows(self, codes: Iterable[str]) -> np.ndarray:
+        # 不存在或本轮无推送的code返回 -1
+        rows = np.fromiter((self.code_rows.get(code, -1) for code in codes), dtype=np.int64)
+        found = rows >= 0
+        found[found] = self.valid[rows[found]]
+        return np.where(found, rows, -1)
+
+    def column(self, field: str) -> np.ndarray:
+        return self.columns[field]
+
+    def __getitem__(self, code: str) -> QuoteRow:
+        row = self.code_rows.get(code)
+        if row is None or not self.valid[row]:
+            raise KeyError(code)
+        return QuoteRow(self.columns, row)
+
+    def __contains__(self, code) -> bool:
+        row = self.code_rows.get(code)
+        return row is not None and bool(self.valid[row])
+
+    def __iter__(self):
+        valid = self.valid
+        return (code for code, row in self.code_rows.items() if valid[row])
+
+    def __len__(self) -> int:
+        return self.count
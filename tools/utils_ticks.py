@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import shutil
+import datetime
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+tick_sessions = [('09:15', '11:30'), ('13:00', '15:00')]   # 与 XtSubscriber 订阅行情的时段一致
+tick_interval = 3               # 全推快照的间隔秒数
+default_tick_init_size = 256    # 初始分配，冷门股推送少不用一次占满
+
+
+def get_session_seconds(sessions: List[Tuple[str, str]]) -> int:
+    def to_seconds(hhmm: str) -> int:
+        return int(hhmm[:2]) * 3600 + int(hhmm[3:]) * 60
+    return sum(to_seconds(end) - to_seconds(start) for start, end in sessions)
+
+
+# 一整天订阅时段内的快照数（约5100个），再留出推送抖动的余量
+default_tick_capacity = get_session_seconds(tick_sessions) // tick_interval + default_tick_init_size
+
+
+class TickRing:
+    """
+    单只股票的定长环形缓冲，写满后覆盖最早的 tick
+    时间为毫秒时间戳 int64，价格 float32，累计成交量 int64
+    """
+    def __init__(self, capacity: int = default_tick_capacity):
+        self.capacity = capacity
+        size = min(default_tick_init_size, capacity)
+        self.times = np.zeros(size, dtype=np.int64)
+        self.prices = np.zeros(size, dtype=np.float32)
+        self.volumes = np.zeros(size, dtype=np.int64)
+        self.total = 0      # 累计写入条数，包括已被覆盖的
+        self.flushed = 0    # 已落盘的累计条数
+
+    def append(self, tick_time: int, price: float, volume: int) -> None:
+        size = len(self.times)
+        if self.total >= size and size < self.capacity:
+            # 未到容量上限前按倍数扩容，扩容时还未发生覆盖，直接拷贝
+            size = min(size * 2, self.capacity)
+            self.times = np.resize(self.times, size)
+            self.prices = np.resize(self.prices, size)
+            self.volumes = np.resize(self.volumes, size)
+
+        i = self.total % size
+        self.times[i] = tick_time
+        self.prices[i] = price
+        self.volumes[i] = volume
+        self.total += 1
+
+    def __len__(self) -> int:
+        return min(self.total, len(self.times))
+
+    def get_arrays(self, last: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # 按时间顺序返回最近 last 条，默认返回缓冲内的全部
+        count = len(self) if last is None else min(last, len(self))
+        size = len(self.times)
+        index = np.arange(self.total - count, self.total) % size
+        return self.times[index], self.prices[index], self.volumes[index]
+
+    def pop_unflushed(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # 取出上次落盘之后的新 tick，两次落盘间超出容量的部分已被覆盖
+        total = self.total
+        count = min(total - self.flushed, len(self.times))
+        size = len(self.times)
+        index = np.arange(total - count, total) % size
+        self.flushed = total
+        return self.times[index], self.prices[index], self.volumes[index]
+
+
+class TickRecorder:
+    """
+    盘中 tick 历史 { code: TickRing }，只存原始数值，导出时才格式化时间
+    行情回调写入和定时落盘在不同线程，每次推送整批写入时持锁一次
+    """
+    def __init__(self, capacity: int = default_tick_capacity):
+        self.capacity = capacity
+        self.rings: Dict[str, TickRing] = {}
+        self.lock = threading.Lock()
+
+    def record(self, quotes: Dict[str, Dict]) -> None:
+        with self.lock:
+            rings = self.rings
+            for code, quote in quotes.items():
+                ring = rings.get(code)
+                if ring is None:
+                    ring = rings[code] = TickRing(self.capacity)
+                ring.append(quote['time'], quote['lastPrice'], quote['volume'])
+
+    def pop_unflushed(self) -> Tuple[List[str], List[Tuple[np.ndarray, np.ndarray, np.ndarray]]]:
+        # 取出所有股票上次落盘之后的新 tick，返回的是拷贝，落盘时不再持锁
+        codes = []
+        chunks = []
+        with self.lock:
+            for code, ring in self.rings.items():
+                if ring.total > ring.flushed:
+                    codes.append(code)
+                    chunks.append(ring.pop_unflushed())
+        return codes, chunks
+
+    def clear(self) -> None:
+        with self.lock:
+            self.rings.clear()
+
+    def __contains__(self, code: str) -> bool:
+        return code in self.rings
+
+    def __len__(self) -> int:
+        return len(self.rings)
+
+    def get_ticks(self, code: str) -> List[list]:
+        # 导出成原 today_ticks 的格式 [ 成交时间, 成交价格, 累计成交量 ]
+        if code not in self.rings:
+            return []
+
+        with self.lock:
+            times, prices, volumes = self.rings[code].get_arrays()
+        return [
+            [
+                datetime.datetime.fromtimestamp(t / 1000).strftime('%H:%M:%S'),
+                round(float(p), 2),
+                int(v),
+            ]
+            for t, p, v in zip(times, prices, volumes)
+        ]
+
+    def to_dict(self) -> Dict[str, List[list]]:
+        return {code: self.get_ticks(code) for code in list(self.rings)}
+
+
+# ================
+# tick 历史落盘
+# ================
+TICK_COLUMNS = ['times', 'prices', 'volumes']
+
+
+class TickArchive:
+    """
+    按日存放的 tick 归档目录 {root}/{date}/
+    盘中增量写 part_XXXX.npz，崩溃也只丢最后一次落盘后的数据
+    收盘后合并成按 code 连续存放的列文件 codes/offsets/times/prices/volumes.npy，可 mmap 按列读取
+    code 的第 i 只股票的数据为 [offsets[i], offsets[i + 1]) 区间
+    合并结果写在新的 merged_XXXX/ 目录，最后原子替换 manifest.json 指向它并记下已并入的增量文件
+    manifest 替换之前崩溃不影响原数据，之后崩溃残留的增量文件按 manifest 跳过，不会重复合并
+    """
+    def __init__(self, root: str, date: str):
+        self.path = os.path.join(root, date)
+        self.manifest_path = os.path.join(self.path, 'manifest.json')
+
+    def read_manifest(self) -> Dict:
+        # { 'dir': 合并目录名, 'parts': 已并入的增量文件名 }，没合并过时 dir 为 None
+        if not os.path.exists(self.manifest_path):
+            return {'dir': None, 'parts': []}
+        with open(self.manifest_path, 'r') as r:
+            return json.load(r)
+
+    def get_part_paths(self) -> List[str]:
+        if not os.path.exists(self.path):
+            return []
+        merged = set(self.read_manifest()['parts'])
+        names = sorted(
+            name for name in os.listdir(self.path)
+            if name.startswith('part_') and name.endswith('.npz') and name not in merged)
+        return [os.path.join(self.path, name) for name in names]
+
+    def is_consolidated(self) -> bool:
+        return self.read_manifest()['dir'] is not None
+
+    def flush(self, recorder: TickRecorder) -> int:
+        codes, chunks = recorder.pop_unflushed()
+        if len(codes) == 0:
+            return 0
+
+        counts = [len(chunk[0]) for chunk in chunks]
+        os.makedirs(self.path, exist_ok=True)
+        # 文件名按纳秒时间递增且不复用，合并后删掉的增量文件名不会再被新数据占用
+        part_path = os.path.join(self.path, f'part_{time.time_ns():020d}.npz')
+        temp_path = part_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(
+                f,
+                codes=np.array(codes),
+                offsets=np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+                times=np.concatenate([chunk[0] for chunk in chunks]),
+                prices=np.concatenate([chunk[1] for chunk in chunks]),
+                volumes=np.concatenate([chunk[2] for chunk in chunks]),
+            )
+        os.replace(temp_path, part_path)
+        return int(sum(counts))
+
+    def read_parts(self, part_paths: List[str] = None) -> List[Dict[str, np.ndarray]]:
+        parts = []
+        if self.is_consolidated():
+            parts.append(self.read_columns(mmap=False))
+        for part_path in (part_paths if part_paths is not None else self.get_part_paths()):
+            with np.load(part_path) as npz:
+                parts.append({key: npz[key] for key in ['codes', 'offsets'] + TICK_COLUMNS})
+        return parts
+
+    def read_columns(self, mmap: bool = True) -> Dict[str, np.ndarray]:
+        mmap_mode = 'r' if mmap else None
+        merged_path = os.path.join(self.path, self.read_manifest()['dir'])
+        return {
+            key: np.load(os.path.join(merged_path, f'{key}.npy'), mmap_mode=mmap_mode)
+            for key in ['codes', 'offsets'] + TICK_COLUMNS
+        }
+
+    @staticmethod
+    def merge_parts(parts: List[Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        # 同一 code 的 tick 按落盘顺序连续排列
+        code_ids: Dict[str, int] = {}
+        ids = []
+        for part in parts:
+            part_ids = np.array([code_ids.setdefault(str(code), len(code_ids)) for code in part['codes']], dtype=np.int64)
+            ids.append(np.repeat(part_ids, np.diff(part['offsets'])))
+        ids = np.concatenate(ids)
+
+        order = np.argsort(ids, kind='stable')
+        counts = np.bincount(ids, minlength=len(code_ids))
+        columns = {
+            'codes': np.array(list(code_ids.keys())),
+            'offsets': np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        }
+        for key in TICK_COLUMNS:
+            columns[key] = np.concatenate([part[key] for part in parts])[order]
+        return columns
+
+    def consolidate(self) -> int:
+        # 合并已有列文件和所有增量文件，manifest 指向新目录之后才删旧目录和增量文件
+        manifest = self.read_manifest()
+        part_paths = self.get_part_paths()
+        parts = self.read_parts(part_paths)
+        if len(parts) == 0:
+            return 0
+
+        columns = self.merge_parts(parts)
+        merged_dir = f'merged_{time.time_ns():020d}'
+        merged_path = os.path.join(self.path, merged_dir)
+        os.makedirs(merged_path)
+        for key, values in columns.items():
+            np.save(os.path.join(merged_path, f'{key}.npy'), values)
+
+        merged_parts = manifest['parts'] + [os.path.basename(part_path) for part_path in part_paths]
+        temp_path = self.manifest_path + '.tmp'
+        with open(temp_path, 'w') as w:
+            json.dump({'dir': merged_dir, 'parts': merged_parts}, w)
+        os.replace(temp_path, self.manifest_path)
+
+        # 提交点之后的清理，中途失败也只是留下会被跳过的文件，下次合并时一并删掉
+        if manifest['dir'] is not None:
+            shutil.rmtree(os.path.join(self.path, manifest['dir']), ignore_errors=True)
+        for name in merged_parts:
+            part_path = os.path.join(self.path, name)
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        return int(columns['offsets'][-1])
+
+    def load(self) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        # { code: (times, prices, volumes) }，已合并且无增量时返回的是 mmap 上的切片，不占内存
+        if len(self.get_part_paths()) == 0:
+            if not self.is_consolidated():
+                return {}
+            columns = self.read_columns(mmap=True)
+        else:
+            columns = self.merge_parts(self.read_parts())
+
+        offsets = columns['offsets']
+        return {
+            str(code): tuple(columns[key][offsets[i]:offsets[i + 1]] for key in TICK_COLUMNS)
+            for i, code in enumerate(columns['codes'])
+        }
@@ -1,7 +1,9 @@
 import datetime
 import logging
+from typing import List
 
-from delegate.base_delegate import BaseDelegate
+from delegate.base_delegate import BaseDelegate, BasketOrder
+from delegate.order_inflight import SIDE_BUY
 
 from tools.utils_basic import get_limit_up_price
 
@@ -25,6 +27,10 @@ class BaseBuyer:
     ):
 
         if volume > 0:
+            if not self.delegate.inflight_orders.try_add(code, SIDE_BUY):
+                print(f'{code} 已有在途买单，不重复委托')
+                return
+
             order_price = price + self.order_premium
             limit_price = get_limit_up_price(code, last_close)
 
@@ -67,3 +73,7 @@ class BaseBuyer:
                     remark=remark)
         else:
             print(f'{code} 挂单买量为0，不委托')
+
+    def order_buy_basket(self, orders: List[BasketOrder]) -> list:
+        # 一批买单一起定价提交，委托记录和通知合并
+        return self.delegate.submit_basket(orders, self.strategy_name, self.order_premium)
@@ -3,24 +3,41 @@ import talib as ta
 import akshare as ak
 
 from mytt.MyTT_advance import *
+from tools.utils_cache import indicator_cache, get_last_bar, get_daily_bar_key
+
+
+def get_index_daily(symbol: str, days: int = 250) -> pd.DataFrame:
+    # 同一根日线期间重复刷新股票池不再重复拉取指数日线，盘中不缓存
+    def fetch() -> pd.DataFrame:
+        end_dt = datetime.datetime.now() - datetime.timedelta(days=0)
+        start_dt = end_dt - datetime.timedelta(days=days)  # EMA 时间必须够长
+        return ak.index_zh_a_hist(
+            symbol=symbol,
+            period="daily",
+            start_date=start_dt.strftime('%Y%m%d'),
+            end_date=end_dt.strftime('%Y%m%d'),
+        )
+
+    bar_key = get_daily_bar_key(datetime.datetime.now())
+    return indicator_cache.get_or_compute(symbol, 'index_zh_a_hist', (days, ), bar_key, fetch)
 
 
 def get_ma_trend_indicator(
     symbol: str = '000985',
     p: int = 5,
 ) -> (bool, dict):
-    end_dt = datetime.datetime.now() - datetime.timedelta(days=0)
-    start_dt = end_dt - datetime.timedelta(days=250)  # EMA 时间必须够长
-    df = ak.index_zh_a_hist(
-        symbol=symbol,
-        period="daily",
-        start_date=start_dt.strftime('%Y%m%d'),
-        end_date=end_dt.strftime('%Y%m%d'),
-    )
-    close = df['收盘'].values
-    df['MA5'] = ta.MA(close, p)
-    df['SAFE'] = df['MA5'] < df['收盘']
-    return df['SAFE'].values[-1], {'df': df}
+    df = get_index_daily(symbol)
+
+    def compute() -> (bool, dict):
+        # get_index_daily 返回的是共享缓存，在副本上加指标列
+        data = df.copy()
+        close = data['收盘'].values
+        data['MA5'] = ta.MA(close, p)
+        data['SAFE'] = data['MA5'] < data['收盘']
+        return data['SAFE'].values[-1], {'df': data}
+
+    last_bar = get_last_bar(df, '日期', '收盘')
+    return indicator_cache.get_or_compute(symbol, get_ma_trend_indicator, (p, ), last_bar, compute)
 
 
 def get_macd_trend_indicator(
@@ -30,30 +47,30 @@ def get_macd_trend_indicator(
     ap: int = 7,
     sa: int = 5,
 ) -> (bool, dict):
-    end_dt = datetime.datetime.now() - datetime.timedelta(days=0)
-    start_dt = end_dt - datetime.timedelta(days=250)  # EMA 时间必须够长
-    df = ak.index_zh_a_hist(
-        symbol=symbol,
-        period="daily",
-        start_date=start_dt.strftime('%Y%m%d'),
-        end_date=end_dt.strftime('%Y%m%d'),
-    )
-    close = df['收盘'].values
-
-    # DIF = EMA(CLOSE, 10) - EMA(CLOSE, 22)
-    # DEA = EMA(DIF, 7)
-    # macd = (DIF - DEA) * 2
-    # macd = MACD(CLOSE, 10, 22, 7)
-    # print(macd)
-
-    df['DIF'], df['DEA'], df['MACD'] = ta.MACD(
-        close,
-        fastperiod=fp,
-        slowperiod=sp,
-        signalperiod=ap,
-    )
-    df['MACD'] = df['MACD'] * 2
-    df['SLOPE'] = SLOPE(df['MACD'], sa)
-    df['SAFE'] = (df['MACD'] > 0) & (df['SLOPE'] > 0) | (df['SLOPE'] > 8)
-
-    return df['SAFE'].values[-1], {'df': df}
+    df = get_index_daily(symbol)
+
+    def compute() -> (bool, dict):
+        # get_index_daily 返回的是共享缓存，在副本上加指标列
+        data = df.copy()
+        close = data['收盘'].values
+
+        # DIF = EMA(CLOSE, 10) - EMA(CLOSE, 22)
+        # DEA = EMA(DIF, 7)
+        # macd = (DIF - DEA) * 2
+        # macd = MACD(CLOSE, 10, 22, 7)
+        # print(macd)
+
+        data['DIF'], data['DEA'], data['MACD'] = ta.MACD(
+            close,
+            fastperiod=fp,
+            slowperiod=sp,
+            signalperiod=ap,
+        )
+        data['MACD'] = data['MACD'] * 2
+        data['SLOPE'] = SLOPE(data['MACD'], sa)
+        data['SAFE'] = (data['MACD'] > 0) & (data['SLOPE'] > 0) | (data['SLOPE'] > 8)
+
+        return data['SAFE'].values[-1], {'df': data}
+
+    last_bar = get_last_bar(df, '日期', '收盘')
+    return indicator_cache.get_or_compute(symbol, get_macd_trend_indicator, (fp, sp, ap, sa), last_bar, compute)
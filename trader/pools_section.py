@@ -7,6 +7,7 @@ import talib as ta
 
 from mytt.MyTT_advance import *
 from tools.utils_basic import pd_show_all, symbol_to_code
+from tools.utils_cache import indicator_cache, get_last_bar, get_daily_bar_key
 
 
 def select_industry_sections(
@@ -50,28 +51,38 @@ def select_dfcf_industry_sections(
     if end_date is None:
         end_date = (now - datetime.timedelta(days=1)).strftime("%Y%m%d")
 
+    today = now.strftime("%Y%m%d")
+    bar_key = end_date if end_date < today else get_daily_bar_key(now)
+
     section_result = []
     for section_name in section_names:
         print(section_name, end=' ')
 
-        time.sleep(1)
-        df = ak.stock_board_industry_hist_em(
-            symbol=section_name,
-            start_date=start_date,
-            end_date=end_date,
-            period="日k",
-            adjust=adjust,
-        ).rename(columns={
-            '日期': 'datetime',
-            '开盘': 'open',
-            '收盘': 'close',
-            '最高': 'high',
-            '最低': 'low',
-            '成交量': 'volume',
-            '成交额': 'amount',
-        })[['datetime', 'open', 'close', 'high', 'low', 'volume', 'amount']]
-
-        if select_industry_sections(df):
+        def fetch() -> pd.DataFrame:
+            time.sleep(1)
+            return ak.stock_board_industry_hist_em(
+                symbol=section_name,
+                start_date=start_date,
+                end_date=end_date,
+                period="日k",
+                adjust=adjust,
+            ).rename(columns={
+                '日期': 'datetime',
+                '开盘': 'open',
+                '收盘': 'close',
+                '最高': 'high',
+                '最低': 'low',
+                '成交量': 'volume',
+                '成交额': 'amount',
+            })[['datetime', 'open', 'close', 'high', 'low', 'volume', 'amount']]
+
+        # 截止日期默认是昨天，K线已经走完，同一参数的板块日线只拉一次
+        df = indicator_cache.get_or_compute(
+            section_name, 'stock_board_industry_hist_em', (start_date, end_date, adjust), bar_key, fetch)
+
+        last_bar = get_last_bar(df)
+        if indicator_cache.get_or_compute(
+                section_name, select_industry_sections, (), last_bar, lambda: select_industry_sections(df)):
             section_result.append(section_name)
 
     print(f'\n{len(section_result)}/{len(section_names)}')
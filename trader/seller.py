@@ -1,12 +1,55 @@
 import datetime
 import logging
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 from xtquant.xttype import XtPosition
 
-from delegate.base_delegate import BaseDelegate
+from delegate.base_delegate import BaseDelegate, BasketOrder
+from delegate.order_inflight import SIDE_SELL
 from tools.utils_basic import get_limit_down_price
+from tools.utils_quotes import ColumnarQuotes
+
+
+class SellBatch:
+    """
+    一次卖点扫描里所有待检查持仓的数组视图，第 i 行对应 positions[i]
+    只包含有行情且有持仓天数记录的持仓，没有历史最高价的 max_price 为 NaN
+    """
+    def __init__(
+        self,
+        quotes: Dict[str, Dict],
+        positions: List[XtPosition],
+        held_days: Dict[str, int],
+        max_prices: Dict[str, float],
+    ):
+        self.positions = [
+            position for position in positions
+            if (position.stock_code in quotes) and (position.stock_code in held_days)
+        ]
+        self.codes = [position.stock_code for position in self.positions]
+        self.quotes = quotes
+        self.max_prices = max_prices
+
+        if isinstance(quotes, ColumnarQuotes):
+            rows = quotes.get_rows(self.codes)
+            self.curr_price = quotes.column('lastPrice')[rows]
+            self.last_close = quotes.column('lastClose')[rows]
+        else:
+            self.curr_price = np.array([quotes[code]['lastPrice'] for code in self.codes], dtype=np.float64)
+            self.last_close = np.array([quotes[code]['lastClose'] for code in self.codes], dtype=np.float64)
+
+        self.cost_price = np.array([position.open_price for position in self.positions], dtype=np.float64)
+        self.sell_volume = np.array([position.can_use_volume for position in self.positions], dtype=np.int64)
+        self.held_day = np.array([held_days[code] for code in self.codes], dtype=np.int64)
+        self.max_price = np.array([max_prices.get(code, np.nan) for code in self.codes], dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def empty_remarks(self) -> np.ndarray:
+        return np.full(len(self.codes), '', dtype=object)
 
 
 class BaseSeller:
@@ -18,6 +61,10 @@ class BaseSeller:
     def order_sell(self, code, quote, volume, remark, log=True) -> None:
         # TODO: 20cm
         if volume > 0:
+            if not self.delegate.inflight_orders.try_add(code, SIDE_SELL):
+                print(f'{code} 已有在途卖单，不重复委托')
+                return
+
             order_price = quote['lastPrice'] - self.order_premium
             limit_price = get_limit_down_price(code, quote['lastClose'])
             if order_price < limit_price:
@@ -74,7 +121,7 @@ class BaseSeller:
                     position=position,
                     held_day=held_days[code],
                     max_price=max_prices[code] if code in max_prices else None,
-                    history=cache_history[code] if code in cache_history else None,
+                    history=cache_history.get(code),
                 )
 
     def check_sell(
@@ -83,3 +130,54 @@ class BaseSeller:
         history: Optional[pd.DataFrame],
     ) -> bool:
         return False  # False 表示没有卖过，不阻挡其他Seller卖出
+
+    # ================
+    # 批量卖出
+    # ================
+    def execute_sell_batch(
+        self,
+        quotes: Dict[str, Dict],
+        curr_date: str,
+        curr_time: str,
+        positions: List[XtPosition],
+        held_days: Dict[str, int],
+        max_prices: Dict[str, float],
+        cache_history: Dict[str, pd.DataFrame]
+    ) -> None:
+        batch = SellBatch(quotes, positions, held_days, max_prices)
+        if len(batch) == 0:
+            return
+
+        result = self.batch_check_sell(batch, curr_date, curr_time, cache_history)
+        if result is None:
+            # 不支持批量判断的卖出策略按原方式逐个检查
+            self.execute_sell(quotes, curr_date, curr_time, positions, held_days, max_prices, cache_history)
+            return
+
+        sold, remarks = result
+        self.batch_order_sell(batch, sold, remarks)
+
+    def batch_order_sell(self, batch: SellBatch, sold: np.ndarray, remarks: np.ndarray) -> None:
+        # 同一次扫描的卖单作为一个篮子提交
+        orders = []
+        for i in np.flatnonzero(sold):
+            if batch.sell_volume[i] > 0:
+                orders.append(BasketOrder(
+                    code=batch.codes[i],
+                    price=float(batch.curr_price[i]),
+                    last_close=float(batch.last_close[i]),
+                    volume=int(batch.sell_volume[i]),
+                    remark=remarks[i],
+                    is_buy=False,
+                ))
+            else:
+                print(f'{batch.codes[i]} 挂单卖量为0，不委托')
+        if len(orders) > 0:
+            self.delegate.submit_basket(orders, self.strategy_name, self.order_premium)
+
+    def batch_check_sell(
+        self, batch: SellBatch, curr_date: str, curr_time: str,
+        cache_history: Dict[str, pd.DataFrame],
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        # 返回 (是否卖出, 卖出备注) 两个数组，返回 None 表示该策略不支持批量判断
+        return None
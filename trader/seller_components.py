@@ -1,11 +1,12 @@
+import numpy as np
 import pandas as pd
-import talib as ta
 from typing import Dict, Optional
 
 from xtquant.xttype import XtPosition
 
+from mytt.MyTT_stream import MA
 from tools.utils_basic import get_limit_up_price
-from trader.seller import BaseSeller
+from trader.seller import BaseSeller, SellBatch
 
 
 # ================================
@@ -36,6 +37,18 @@ class HardSeller(BaseSeller):
                 self.order_sell(code, quote, sell_volume, '绝对止盈')
                 return True
 
+    def batch_check_sell(self, batch: SellBatch, curr_date: str, curr_time: str, cache_history: Dict):
+        held = batch.held_day > 0
+        switch_lower = batch.cost_price * (self.risk_limit + batch.held_day * self.risk_tight)
+
+        loss = held & (batch.curr_price <= switch_lower)
+        earn = held & ~loss & (batch.curr_price >= batch.cost_price * self.earn_limit)
+
+        remarks = batch.empty_remarks()
+        remarks[loss] = '绝对止损'
+        remarks[earn] = '绝对止盈'
+        return loss | earn, remarks
+
 
 # ================================
 # 盈利未达预期则卖出换仓
@@ -64,6 +77,16 @@ class SwitchSeller(BaseSeller):
 
         return False
 
+    def batch_check_sell(self, batch: SellBatch, curr_date: str, curr_time: str, cache_history: Dict):
+        remarks = batch.empty_remarks()
+        if curr_time < self.switch_begin_time:
+            return np.zeros(len(batch), dtype=bool), remarks
+
+        switch_upper = batch.cost_price * (1 + batch.held_day * self.switch_demand_daily_up)
+        sold = (batch.held_day > self.switch_hold_days) & (batch.curr_price < switch_upper)
+        remarks[sold] = '换仓卖单'
+        return sold, remarks
+
 
 # ================================
 # 历史最高价回落比例止盈
@@ -92,6 +115,20 @@ class FallSeller(BaseSeller):
 
         return False
 
+    def batch_check_sell(self, batch: SellBatch, curr_date: str, curr_time: str, cache_history: Dict):
+        # 没有历史最高价的 max_price 为 NaN，比较结果都是 False
+        sold = np.zeros(len(batch), dtype=bool)
+        remarks = batch.empty_remarks()
+        held = batch.held_day > 0
+
+        for inc_min, inc_max, fall_threshold in self.fall_from_top:  # 逐级回落卖出，先命中的级别优先
+            hit = held & ~sold \
+                & (batch.cost_price * inc_min <= batch.max_price) & (batch.max_price < batch.cost_price * inc_max) \
+                & (batch.curr_price < batch.max_price * (1 - fall_threshold))
+            remarks[hit] = f'涨{int((inc_min - 1) * 100)}%回落'
+            sold |= hit
+        return sold, remarks
+
 
 # ================================
 # 涨幅回撤百分止盈
@@ -120,6 +157,19 @@ class ReturnSeller(BaseSeller):
 
         return False
 
+    def batch_check_sell(self, batch: SellBatch, curr_date: str, curr_time: str, cache_history: Dict):
+        sold = np.zeros(len(batch), dtype=bool)
+        remarks = batch.empty_remarks()
+        held = batch.held_day > 0
+
+        for inc_min, inc_max, fall_percentage in self.return_of_profit:  # 逐级回落止盈，先命中的级别优先
+            hit = held & ~sold \
+                & (batch.cost_price * inc_min <= batch.max_price) & (batch.max_price < batch.cost_price * inc_max) \
+                & (batch.curr_price < batch.max_price - (batch.max_price - batch.cost_price) * fall_percentage)
+            remarks[hit] = f'涨{int((inc_min - 1) * 100)}%止盈'
+            sold |= hit
+        return sold, remarks
+
 
 # ================================
 # 尾盘涨停卖出
@@ -146,6 +196,22 @@ class TailCapSeller(BaseSeller):
 
         return False
 
+    def batch_check_sell(self, batch: SellBatch, curr_date: str, curr_time: str, cache_history: Dict):
+        remarks = batch.empty_remarks()
+        if curr_time < self.tail_start_minute:
+            return np.zeros(len(batch), dtype=bool), remarks
+
+        # 涨停价按原有规则逐个算，保证和单个检查时的取整一致；没有历史的记为 NaN 不卖
+        histories = [cache_history.get(code) for code in batch.codes]
+        limit_up = np.array([
+            get_limit_up_price(code, history['close'].values[-1]) if history is not None else np.nan
+            for code, history in zip(batch.codes, histories)
+        ], dtype=np.float64)
+
+        sold = (batch.held_day > 0) & (batch.curr_price >= limit_up)
+        remarks[sold] = '尾盘涨停'
+        return sold, remarks
+
 
 # ================================
 # 开仓日当天指标尾盘止损
@@ -189,6 +255,16 @@ class MASeller(BaseSeller):
 
         print(f'跌破{parameters.ma_above}日均线卖出策略', end=' ')
         self.ma_above = parameters.ma_above
+        self.ma_streams: Dict[str, tuple] = {}    # { code: (日期, 流式MA) } 每天用历史初始化一次
+
+    def get_ma_stream(self, code: str, curr_date: str, history: pd.DataFrame) -> MA:
+        cached = self.ma_streams.get(code)
+        if cached is not None and cached[0] == curr_date:
+            return cached[1]
+
+        stream = MA(self.ma_above).seed(history['close'].values)
+        self.ma_streams[code] = (curr_date, stream)
+        return stream
 
     def check_sell(self, code: str, quote: Dict, curr_date: str, curr_time: str, position: XtPosition,
                    held_day: int, max_price: Optional[float], history: Optional[pd.DataFrame]) -> bool:
@@ -198,20 +274,9 @@ class MASeller(BaseSeller):
                 sell_volume = position.can_use_volume
 
                 curr_price = quote['lastPrice']
-                curr_vol = quote['volume']
-
-                df = history._append({
-                    'datetime': curr_date,
-                    'open': quote['open'],
-                    'high': quote['high'],
-                    'low': quote['low'],
-                    'close': curr_price,
-                    'volume': curr_vol,
-                    'amount': quote['amount'],
-                }, ignore_index=True)
 
-                ma_values = ta.MA(df.close.tail(self.ma_above + 1), timeperiod=self.ma_above)
-                ma_value = ma_values.values[-1]
+                # 当天的均线 = (前N-1日收盘价之和 + 现价) / N，历史不足时为 nan 不卖
+                ma_value = self.get_ma_stream(code, curr_date, history).update(curr_price)
 
                 if curr_price < ma_value - 0.01:
                     self.order_sell(code, quote, sell_volume, '破均卖单')
@@ -223,6 +288,19 @@ class MASeller(BaseSeller):
 # ================================
 # CCI 冲高回落卖出
 # ================================
+cci_period = 14
+
+
+def get_cci_value(typical_prices: np.ndarray) -> float:
+    # 与 talib.CCI 一致：偏离或平均绝对偏差为 0 时返回 0
+    avg = typical_prices.mean()
+    diff = typical_prices[-1] - avg
+    mean_dev = np.abs(typical_prices - avg).mean()
+    if diff == 0 or mean_dev == 0:
+        return 0.0
+    return float(diff / (0.015 * mean_dev))
+
+
 class CCISeller(BaseSeller):
     def __init__(self, strategy_name, delegate, parameters):
         BaseSeller.__init__(self, strategy_name, delegate, parameters)
@@ -230,6 +308,23 @@ class CCISeller(BaseSeller):
         print('CCI卖出策略', end=' ')
         self.cci_upper = parameters.cci_upper
         self.cci_lower = parameters.cci_lower
+        self.cci_states: Dict[str, tuple] = {}  # { code: (日期, 最近13日典型价格数组, 昨日CCI) } 每天只算一次
+
+    def get_cci_state(self, code: str, curr_date: str, history: pd.DataFrame) -> tuple:
+        cached = self.cci_states.get(code)
+        if cached is not None and cached[0] == curr_date:
+            return cached
+
+        typical = ((history['high'].values + history['low'].values + history['close'].values) / 3).astype(np.float64)
+        if len(typical) >= cci_period - 1:
+            # 预留一个位置给实时价格
+            prev_typical = np.append(typical[len(typical) - (cci_period - 1):], np.nan)
+        else:
+            prev_typical = None
+        prev_cci = get_cci_value(typical[-cci_period:]) if len(typical) >= cci_period else np.nan
+
+        self.cci_states[code] = (curr_date, prev_typical, prev_cci)
+        return self.cci_states[code]
 
     def check_sell(self, code: str, quote: Dict, curr_date: str, curr_time: str, position: XtPosition,
                    held_day: int, max_price: Optional[float], history: Optional[pd.DataFrame]) -> bool:
@@ -238,21 +333,12 @@ class CCISeller(BaseSeller):
             if held_day > 0 and int(curr_time[-2:]) % 5 == 0:  # 每隔5分钟 CCI 卖出
                 sell_volume = position.can_use_volume
 
-                curr_price = quote['lastPrice']
-                curr_vol = quote['volume']
-
-                df = history._append({
-                    'datetime': curr_date,
-                    'open': quote['open'],
-                    'high': quote['high'],
-                    'low': quote['low'],
-                    'close': curr_price,
-                    'volume': curr_vol,
-                    'amount': quote['amount'],
-                }, ignore_index=True)
-
-                df['CCI'] = ta.CCI(df['high'], df['low'], df['close'], timeperiod=14)
-                cci = df['CCI'].tail(2).values
+                # 昨日 CCI 与前13日典型价格每天只算一次，盘中只用当前行情补上最后一个
+                _, prev_typical, prev_cci = self.get_cci_state(code, curr_date, history)
+                if prev_typical is None:
+                    return False
+                prev_typical[-1] = (quote['high'] + quote['low'] + quote['lastPrice']) / 3
+                cci = [prev_cci, get_cci_value(prev_typical)]
 
                 if cci[0] > self.cci_lower > cci[1]:  # CCI 下穿
                     self.order_sell(code, quote, sell_volume, '低CCI卖')
@@ -23,6 +23,41 @@ class GroupSellers:
                                              position=position, held_day=held_day, max_price=max_price, history=history)
         return sold
 
+    def execute_sell_batch(self, quotes, curr_date, curr_time, positions, held_days, max_prices, cache_history):
+        batch = SellBatch(quotes, positions, held_days, max_prices)
+        if len(batch) == 0:
+            return
+
+        sold = np.zeros(len(batch), dtype=bool)     # 已被优先级更高的策略卖出
+        ordered = np.zeros(len(batch), dtype=bool)  # 逐个检查时已经在 check_sell 里委托过
+        remarks = batch.empty_remarks()
+
+        # 按父类顺序即优先级合并各策略的卖出结果
+        for parent in self.__class__.__bases__:
+            if parent.__name__ == 'GroupSellers':
+                continue
+
+            result = parent.batch_check_sell(self, batch, curr_date, curr_time, cache_history)
+            if result is not None:
+                mask, parent_remarks = result
+                take = mask & ~sold
+                remarks[take] = parent_remarks[take]
+                sold |= take
+                continue
+
+            # 不支持批量判断的策略只检查还没被卖出的持仓
+            for i in np.flatnonzero(~sold):
+                code = batch.codes[i]
+                if parent.check_sell(
+                    self, code=code, quote=quotes[code], curr_date=curr_date, curr_time=curr_time,
+                    position=batch.positions[i], held_day=held_days[code], max_price=max_prices.get(code),
+                    history=cache_history.get(code),
+                ):
+                    sold[i] = True
+                    ordered[i] = True
+
+        self.batch_order_sell(batch, sold & ~ordered, remarks)
+
 
 class ClassicGroupSeller(GroupSellers, HardSeller, SwitchSeller, ReturnSeller):
     def __init__(self, strategy_name, delegate, parameters):